@@ -0,0 +1,60 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from users.cache import token_version_cache, user_cache
+from users.models import User
+from users.tokens import RoleTokenUser
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT аутентификация, получающая пользователя из кеша.
+    Запрос к БД выполняется только при промахе кеша."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            )
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+        return user
+
+
+def get_token_version(user_id):
+    """Текущая версия токенов активного пользователя или None."""
+    version = token_version_cache.get(user_id)
+    if version is None:
+        version = (
+            User.objects.filter(pk=user_id, is_active=True)
+            .values_list("token_version", flat=True)
+            .first()
+        )
+        if version is not None:
+            token_version_cache.set(user_id, version)
+    return version
+
+
+class RoleJWTAuthentication(CachedJWTAuthentication):
+    """Для токенов RoleAccessToken возвращает RoleTokenUser, построенный
+    по данным токена. Токен отклоняется, если версия токенов пользователя
+    изменилась после его выдачи (например, сменилась роль). Для токенов
+    без роли пользователь загружается как обычно."""
+
+    def get_user(self, validated_token):
+        if "token_version" not in validated_token:
+            return super().get_user(validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if validated_token["token_version"] != get_token_version(user_id):
+            raise AuthenticationFailed(
+                _("Token is outdated"), code="token_outdated"
+            )
+        return RoleTokenUser(validated_token)
@@ -0,0 +1,27 @@
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connections, router, transaction
+
+
+class LockingDatabaseCache(DatabaseCache):
+    """Кеш в БД, в котором incr и decr выполняются под блокировкой записи.
+
+    DatabaseCache.incr читает значение и записывает новое, поэтому два
+    процесса могут прочитать одно значение и потерять увеличение.
+    Здесь чтение и запись выполняются в транзакции, которая начинается
+    с UPDATE записи ключа: он блокирует строку (или всю БД в SQLite)
+    до конца транзакции, и следующий incr читает уже новое значение."""
+
+    def incr(self, key, delta=1, version=None):
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        table = connection.ops.quote_name(self._table)
+        cache_key = self.make_key(key, version=version)
+        self.validate_key(cache_key)
+        with transaction.atomic(using=db):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET cache_key = cache_key "
+                    "WHERE cache_key = %s",
+                    [cache_key],
+                )
+            return super().incr(key, delta, version)
@@ -1,18 +1,82 @@
 from django_filters import rest_framework as filters
-from reviews.models import Title
+from rest_framework.filters import OrderingFilter
+
+from reviews.models import Category, Title
+
+GENRE_MODES = (("any", "any"), ("all", "all"))
+
+
+class CharInFilter(filters.BaseInFilter, filters.CharFilter):
+    """Фильтр по списку значений через запятую."""
 
 
 class TitlesFilter(filters.FilterSet):
     """Фильтр для вьюсета TitleViewSet."""
 
     name = filters.CharFilter(field_name="name", lookup_expr="icontains")
-    category = filters.CharFilter(
-        field_name="category__slug", lookup_expr="icontains"
-    )
-    genre = filters.CharFilter(
-        field_name="genre__slug", lookup_expr="icontains"
+    category = CharInFilter(method="filter_category")
+    genre = CharInFilter(method="filter_genre")
+    genre_mode = filters.ChoiceFilter(
+        choices=GENRE_MODES, method="filter_genre_mode"
     )
+    year_min = filters.NumberFilter(field_name="year", lookup_expr="gte")
+    year_max = filters.NumberFilter(field_name="year", lookup_expr="lte")
+    search = filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Title
-        fields = ["name", "year", "genre", "category"]
+        fields = [
+            "name",
+            "year",
+            "genre",
+            "genre_mode",
+            "category",
+            "year_min",
+            "year_max",
+            "search",
+        ]
+
+    def filter_category(self, queryset, name, value):
+        """Произведения из любой из перечисленных категорий."""
+        return queryset.filter(
+            category__in=Category.objects.filter(slug__in=value)
+        )
+
+    def filter_genre(self, queryset, name, value):
+        """Произведения с любым (genre_mode=any, по умолчанию) или со всеми
+        (genre_mode=all) перечисленными жанрами. Подзапросы по таблице
+        связей не размножают строки, поэтому DISTINCT не нужен."""
+        through = Title.genre.through.objects
+        if self.form.cleaned_data.get("genre_mode") == "all":
+            for slug in set(value):
+                queryset = queryset.filter(
+                    pk__in=through.filter(genre__slug=slug).values("title_id")
+                )
+            return queryset
+        return queryset.filter(
+            pk__in=through.filter(genre__slug__in=value).values("title_id")
+        )
+
+    def filter_genre_mode(self, queryset, name, value):
+        """Режим учитывается в filter_genre."""
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию с ранжированием."""
+        return queryset.search(value)
+
+
+class TitleOrderingFilter(OrderingFilter):
+    """Сортировка произведений по ?ordering=. Вторым ключом добавляется
+    id, чтобы порядок на страницах был однозначным. Без ?ordering=
+    результаты поиска остаются упорядочены по релевантности."""
+
+    def get_ordering(self, request, queryset, view):
+        if self.ordering_param not in request.query_params and (
+            request.query_params.get("search")
+        ):
+            return None
+        ordering = list(super().get_ordering(request, queryset, view) or ())
+        if ordering and not {"id", "-id", "pk", "-pk"} & set(ordering):
+            ordering.append("-id" if ordering[0].startswith("-") else "id")
+        return ordering
@@ -0,0 +1,174 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import CommentViewSet, ReviewViewSet, TitleViewSet, UserViewSet
+from reviews.models import Comment, Genre, Review, Title
+from users.models import User
+
+SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)( USING (?:COVERING )?INDEX)?")
+SORT_ALL = "USE TEMP B-TREE FOR ORDER BY"
+
+
+def plan_status(plan, table):
+    """Оценка плана запроса к table: FAIL - полный просмотр (чтение
+    таблицы без индекса или по индексу, который не задает порядок,
+    с сортировкой всех строк), sort - сортировка строк, найденных по
+    индексу (SEARCH): страница строится после чтения всех подходящих
+    строк, ok - чтение по индексу в нужном порядке."""
+    scans = [
+        match
+        for match in map(SCAN.match, plan)
+        if match and match.group(1) == table
+    ]
+    sorts_all = SORT_ALL in plan
+    if any(not match.group(2) or sorts_all for match in scans):
+        return "FAIL"
+    return "sort" if sorts_all else "ok"
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет GET запросы к основным эндпоинтам API и проверяет через "
+        "EXPLAIN QUERY PLAN, что запрос страницы не просматривает таблицу "
+        "целиком. Запросы, которые сортируют все выбранные строки во "
+        "временном B-дереве, отмечаются как sort. Только для SQLite; нужны "
+        "данные (например, после loaddata)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Печатать планы всех запросов эндпоинта.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("EXPLAIN QUERY PLAN поддерживается для SQLite.")
+        self.verbose_plans = options["verbose_plans"]
+        self.factory = APIRequestFactory()
+        self.admin = User(username="explain", role=User.ADMIN)
+        failed = [
+            name
+            for name, url, view, kwargs, table in self.endpoints()
+            if not self.check_endpoint(name, url, view, kwargs, table)
+        ]
+        if failed:
+            raise CommandError(f"full table scan: {', '.join(failed)}")
+
+    def endpoints(self):
+        """(название, url, view, kwargs, основная таблица) для проверки.
+        Вложенные эндпоинты пропускаются, если для них нет данных."""
+        title = Title._meta.db_table
+        review_table = Review._meta.db_table
+        list_titles = TitleViewSet.as_view({"get": "list"})
+        yield "titles", "/api/v1/titles/", list_titles, {}, title
+        yield (
+            "titles cursor",
+            "/api/v1/titles/?pagination=cursor",
+            list_titles,
+            {},
+            title,
+        )
+        yield (
+            "titles ordering",
+            "/api/v1/titles/?ordering=-rating&pagination=cursor",
+            list_titles,
+            {},
+            title,
+        )
+        genre = Genre.objects.values_list("slug", flat=True).first()
+        if genre is not None:
+            yield (
+                "titles genre",
+                f"/api/v1/titles/?genre={genre}",
+                list_titles,
+                {},
+                title,
+            )
+        yield (
+            "titles top",
+            "/api/v1/titles/top/",
+            TitleViewSet.as_view({"get": "top"}),
+            {},
+            title,
+        )
+        title_id = Review.objects.values_list("title_id", flat=True).first()
+        if title_id is not None:
+            kwargs = {"title_id": title_id}
+            list_reviews = ReviewViewSet.as_view({"get": "list"})
+            url = f"/api/v1/titles/{title_id}/reviews/"
+            yield "reviews", url, list_reviews, kwargs, review_table
+            yield (
+                "reviews cursor",
+                f"{url}?pagination=cursor",
+                list_reviews,
+                kwargs,
+                review_table,
+            )
+        comment = Comment.objects.values_list(
+            "review__title_id", "review_id"
+        ).first()
+        if comment is not None:
+            yield (
+                "comments",
+                "/api/v1/titles/{}/reviews/{}/comments/".format(*comment),
+                CommentViewSet.as_view({"get": "list"}),
+                {"title_id": comment[0], "review_id": comment[1]},
+                Comment._meta.db_table,
+            )
+        yield (
+            "users",
+            "/api/v1/users/",
+            UserViewSet.as_view({"get": "list"}),
+            {},
+            User._meta.db_table,
+        )
+
+    def check_endpoint(self, name, url, view, kwargs, table):
+        """Запрос страницы - первый запрос к основной таблице с LIMIT,
+        кроме подсчета записей."""
+        request = self.factory.get(url)
+        force_authenticate(request, user=self.admin)
+        with CaptureQueriesContext(connection) as context:
+            response = view(request, **kwargs)
+        if response.status_code != 200:
+            raise CommandError(f"{name}: GET {url} -> {response.status_code}")
+        queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT")
+            and f'FROM "{table}"' in query["sql"]
+        ]
+        page = next(
+            (
+                sql
+                for sql in queries
+                if " LIMIT " in sql and not sql.startswith("SELECT COUNT(")
+            ),
+            None,
+        )
+        if page is None:
+            # Пустая выборка: страница не запрашивается, проверять нечего.
+            self.stdout.write(f"skip {name}: no rows in {table}")
+            return True
+        plan = self.explain(page)
+        status = plan_status(plan, table)
+        full_scan = status == "FAIL"
+        self.stdout.write(f"{status:4} {name}: {'; '.join(plan)}")
+        if self.verbose_plans:
+            for sql in queries:
+                self.stdout.write(f"     {sql}")
+                for line in self.explain(sql):
+                    self.stdout.write(f"       {line}")
+        return not full_scan
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
@@ -1,7 +1,198 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import mixins, viewsets
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from reviews import versions
+
+RESPONSE_CACHE = getattr(settings, "RESPONSE_CACHE", "default")
+RESPONSE_CACHE_TIMEOUT = getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+
+
+class NotModified(Exception):
+    """Прерывает обработку запроса готовым ответом 304."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Заголовки ETag и Last-Modified для GET запросов.
+
+    Значения вычисляются из версий данных (reviews.versions), перечисленных
+    в get_version_names, без обращения к queryset. На совпадающие
+    If-None-Match или If-Modified-Since отвечает 304 после проверки прав,
+    но до выполнения запроса к БД и сериализации. Last-Modified не
+    отдается, пока не закончилась секунда последнего изменения. Версии
+    запроса сохраняются в version_stamps для ключей кеша пагинации."""
+
+    version_names = ()
+
+    def get_version_names(self):
+        return self.version_names
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.last_modified = self.version_stamps = None
+        if request.method not in ("GET", "HEAD"):
+            return
+        stamps = versions.get_versions(*self.get_version_names())
+        self.version_stamps = tuple(stamps)
+        variant = "|".join(
+            [
+                request.get_full_path(),
+                request.accepted_media_type,
+                *map(str, stamps),
+            ]
+        )
+        self.etag = '"{}"'.format(
+            hashlib.md5(variant.encode("utf-8")).hexdigest()
+        )
+        self.last_modified = max(stamps) // 1000000
+        if self.last_modified >= versions.now() // 1000000:
+            # Last-Modified точен до секунды: следующая запись в ту же
+            # секунду не изменила бы его, и If-Modified-Since вернул бы 304
+            # на устаревшие данные. Пока секунда не закончилась,
+            # проверяется только ETag.
+            self.last_modified = None
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        if response is not None:
+            raise NotModified(response)
+
+    def cached(self, name, build):
+        """Данные build() из кеша RESPONSE_CACHE под ключом с ETag
+        запроса: при изменении версий данных ключ меняется."""
+        cache = caches[RESPONSE_CACHE]
+        key = f"{name}:{self.etag}"
+        data = cache.get(key)
+        if data is None:
+            data = build()
+            cache.set(key, data, RESPONSE_CACHE_TIMEOUT)
+        return data
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if getattr(self, "etag", None) and response.status_code in (200, 304):
+            response["ETag"] = self.etag
+            if self.last_modified is not None:
+                response["Last-Modified"] = http_date(self.last_modified)
+        return response
+
+
+class CachedListMixin:
+    """Кеширует данные ответа list в кеше RESPONSE_CACHE.
+    Используется вместе с ConditionalGetMixin.
+
+    Ключ - ETag из ConditionalGetMixin: он зависит от пути с параметрами
+    (поиск, страница), формата ответа и версий данных. Запись и удаление
+    объектов меняют версию, и следующий запрос строит ответ заново, а
+    старые записи истекают по таймауту."""
+
+    def list(self, request, *args, **kwargs):
+        parent = super()
+
+        def build():
+            return parent.list(request, *args, **kwargs).data
+
+        return Response(self.cached("list", build))
+
+
+class SparseFieldsMixin:
+    """Запрос к БД под поля ответа для сериалайзеров с
+    SparseFieldsSerializerMixin.
+
+    Если GET запрос содержит ?fields= или ?omit=, filter_queryset читает
+    только колонки оставшихся полей сериалайзера (only) и убирает
+    select_related и prefetch_related для связей, которых нет в ответе.
+    Если источник поля - не поле модели, запрос не меняется."""
+
+    sparse_params = ("fields", "omit")
+
+    def filter_queryset(self, queryset):
+        return self.only_serialized(super().filter_queryset(queryset))
+
+    def only_serialized(self, queryset):
+        request = self.request
+        if request.method not in SAFE_METHODS or not any(
+            request.query_params.get(name) for name in self.sparse_params
+        ):
+            return queryset
+        opts = queryset.model._meta
+        columns = {opts.pk.name}
+        relations = set()
+        for field in self.get_serializer().fields.values():
+            name = field.source.split(".")[0]
+            try:
+                model_field = opts.get_field(name)
+            except FieldDoesNotExist:
+                return queryset
+            if model_field.is_relation:
+                relations.add(name)
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(name)
+        columns.update(self.ordering_columns(queryset))
+        # Менеджер связи (title.reviews) присваивает объектам родителя по
+        # внешнему ключу: без его колонки он читался бы запросом на строку.
+        columns.update(
+            field.name for field in queryset._known_related_objects
+        )
+        return self.only_related(queryset, relations).only(*columns)
+
+    @staticmethod
+    def ordering_columns(queryset):
+        """Поля модели из сортировки: они нужны курсору пагинации."""
+        opts = queryset.model._meta
+        for name in queryset.query.order_by:
+            if not isinstance(name, str):
+                continue
+            try:
+                yield opts.get_field(name.lstrip("-")).name
+            except FieldDoesNotExist:
+                continue
+
+    @staticmethod
+    def only_related(queryset, relations):
+        """select_related и prefetch_related только для связей relations."""
+        select_related = queryset.query.select_related
+        if isinstance(select_related, dict):
+            names = [name for name in select_related if name in relations]
+            # select_related() без аргументов выбрал бы все связи.
+            queryset = queryset.select_related(None)
+            if names:
+                queryset = queryset.select_related(*names)
+        prefetches = [
+            lookup
+            for lookup in queryset._prefetch_related_lookups
+            if (
+                lookup.prefetch_through
+                if isinstance(lookup, Prefetch)
+                else lookup
+            ).split("__")[0]
+            in relations
+        ]
+        return queryset.prefetch_related(None).prefetch_related(*prefetches)
 
 
 class ListCreateDestroyViewSet(
+    ConditionalGetMixin,
+    CachedListMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.DestroyModelMixin,
@@ -0,0 +1,428 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.paginator import (
+    EmptyPage,
+    InvalidPage,
+    Page,
+    PageNotAnInteger,
+    Paginator,
+)
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    PageNumberPagination,
+    _get_displayed_page_numbers,
+    _get_page_links,
+    _reverse_ordering,
+)
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+PAGINATION_COUNT = getattr(
+    settings,
+    "PAGINATION_COUNT",
+    {"CACHE": "default", "TIMEOUT": 60, "LIMIT": None},
+)
+
+
+def count_query(queryset, limit=None):
+    """Запрос для подсчета записей queryset: без сортировки, extra select,
+    select_related и аннотаций без агрегатов, которые не меняют число
+    строк. При limit подсчет останавливается на limit + 1 записи."""
+    query = queryset.query.chain()
+    query.clear_ordering(force_empty=True)
+    query.select_related = False
+    query.set_extra_mask(())
+    if not any(
+        getattr(annotation, "contains_aggregate", False)
+        for annotation in query.annotations.values()
+    ):
+        # Условия фильтров хранят сами выражения, а не ссылки на них.
+        query.annotations.clear()
+        query.set_annotation_mask(None)
+    if limit is not None:
+        query.set_limits(high=limit + 1)
+    return query
+
+
+class PubDateCursorPagination(CursorPagination):
+    """Постраничный вывод по курсору от новых записей к старым."""
+
+    ordering = ("-pub_date", "-id")
+
+
+class KeysetPagination(CursorPagination):
+    """Постраничный вывод по ключу сортировки.
+
+    Курсор CursorPagination хранит значение поля и смещение среди
+    записей с тем же значением, поэтому при сортировке по полю с большим
+    числом повторов (рейтинг, год) смещение растет и упирается в
+    offset_cutoff. Здесь курсор хранит значения всех полей сортировки и
+    id записи, а страница выбирается условием (поля, id) > (значения, id)
+    по индексу первого поля. Сортировка берется из queryset (ее задает
+    фильтр сортировки, поиск по релевантности search_rank или действие,
+    как top), id добавляется последним ключом, поэтому порядок тот же,
+    что и при постраничном выводе по номеру страницы. NULL учитываются
+    в том порядке, в котором их сортирует БД."""
+
+    ordering = ("id",)
+
+    def get_ordering(self, request, queryset, view):
+        pk_name = queryset.model._meta.pk.name
+        ordering = []
+        for name in queryset.query.order_by or self.ordering:
+            if not isinstance(name, str):
+                continue
+            descending = name.startswith("-")
+            if name.lstrip("-") in (pk_name, "pk"):
+                return (*ordering, f"-{pk_name}" if descending else pk_name)
+            ordering.append(name)
+        descending = bool(ordering) and ordering[0].startswith("-")
+        return (*ordering, f"-{pk_name}" if descending else pk_name)
+
+    @staticmethod
+    def ordering_field(queryset, name):
+        """Поле модели или аннотации (как search_rank), по которому
+        сортируется queryset."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.decode_position(self.cursor, queryset)
+        ordering = self.ordering
+        if reverse:
+            ordering = _reverse_ordering(ordering)
+        queryset = queryset.order_by(*ordering)
+        results = []
+        for condition in self.segments_after(queryset, ordering, position):
+            limit = self.page_size + 1 - len(results)
+            results += list(queryset.filter(condition)[:limit])
+            if len(results) > self.page_size:
+                break
+        self.page = results[: self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def segments_after(self, queryset, ordering, position):
+        """Условия на записи, которые идут после position при сортировке
+        ordering, по отрезкам в порядке сортировки. Записи с NULL в первом
+        поле выбираются отдельным запросом: условие с OR IS NULL не дает
+        начать чтение индекса с нужного места."""
+        if position is None:
+            return [Q()]
+        name, lookup, nulls_after = self.key(queryset, ordering[0])
+        value = position[0]
+        if len(ordering) == 1:
+            return [Q(**{f"{name}__{lookup}": value})]
+        rest = self.after(queryset, ordering[1:], position[1:])
+        nulls = Q(**{f"{name}__isnull": True})
+        if value is None:
+            segments = [nulls & rest]
+            if not nulls_after:
+                segments.append(Q(**{f"{name}__isnull": False}))
+            return segments
+        segments = [
+            Q(**{f"{name}__{lookup}e": value})
+            & (Q(**{f"{name}__{lookup}": value}) | rest)
+        ]
+        if nulls_after and self.ordering_field(queryset, name).null:
+            segments.append(nulls)
+        return segments
+
+    def after(self, queryset, ordering, position):
+        """Одно условие (поля) > (значения) при сортировке ordering."""
+        name, lookup, nulls_after = self.key(queryset, ordering[0])
+        value = position[0]
+        if len(ordering) == 1:
+            return Q(**{f"{name}__{lookup}": value})
+        rest = self.after(queryset, ordering[1:], position[1:])
+        if value is None:
+            condition = Q(**{f"{name}__isnull": True}) & rest
+            if not nulls_after:
+                condition |= Q(**{f"{name}__isnull": False})
+            return condition
+        condition = Q(**{f"{name}__{lookup}": value}) | (
+            Q(**{name: value}) & rest
+        )
+        if nulls_after and self.ordering_field(queryset, name).null:
+            condition |= Q(**{f"{name}__isnull": True})
+        return condition
+
+    @staticmethod
+    def key(queryset, key):
+        """Имя поля, lookup следующих значений и идут ли NULL после
+        остальных значений для ключа сортировки key."""
+        descending = key.startswith("-")
+        nulls_after = connections[queryset.db].features.nulls_order_largest
+        return key.lstrip("-"), "lt" if descending else "gt", (
+            nulls_after != descending
+        )
+
+    def decode_position(self, cursor, queryset):
+        """Значения полей сортировки из курсора, последнее - id. Курсор
+        приходит от клиента, поэтому значения приводятся к типам полей:
+        измененный курсор дает 404, а не ошибку в запросе к БД."""
+        if cursor is None or cursor.position is None:
+            return None
+        try:
+            values = json.loads(cursor.position)
+            if not isinstance(values, list) or len(values) != len(
+                self.ordering
+            ):
+                raise ValueError(cursor.position)
+            position = []
+            for key, value in zip(self.ordering[:-1], values):
+                if value is not None:
+                    field = self.ordering_field(queryset, key.lstrip("-"))
+                    value = field.to_python(value)
+                position.append(value)
+            pk = queryset.model._meta.pk.to_python(values[-1])
+            if pk is None:
+                raise ValueError(cursor.position)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return (*position, pk)
+
+    def position_of(self, instance):
+        values = [
+            getattr(instance, key.lstrip("-")) for key in self.ordering[:-1]
+        ]
+        return json.dumps([*values, instance.pk], cls=DjangoJSONEncoder)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self.position_of(self.page[-1])
+        return self.encode_cursor(Cursor(0, False, position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self.position_of(self.page[0])
+        return self.encode_cursor(Cursor(0, True, position))
+
+
+class UncountedPage(Page):
+    """Страница без общего числа записей: наличие следующей страницы
+    известно по лишней записи, выбранной вместе со страницей."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator с упрощенным и кешируемым подсчетом записей.
+
+    COUNT(*) выполняется по count_query. Если задан cache_key, число
+    записей берется из кеша PAGINATION_COUNT["CACHE"] под ключом из
+    cache_key и текста запроса подсчета. Если записей больше count_limit
+    или counted=False, count равен None: страница выбирается с одной
+    лишней записью, по которой определяется наличие следующей."""
+
+    def __init__(
+        self,
+        object_list,
+        per_page,
+        cache_key=None,
+        count_limit=None,
+        counted=True,
+        **kwargs,
+    ):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+        self.count_limit = count_limit
+        self.counted = counted
+
+    @cached_property
+    def count(self):
+        if not self.counted:
+            return None
+        query = count_query(self.object_list, self.count_limit)
+        key = None
+        if self.cache_key is not None:
+            sql = repr(query.sql_with_params())
+            key = "count:{}".format(
+                hashlib.md5(
+                    f"{self.cache_key}|{sql}".encode("utf-8")
+                ).hexdigest()
+            )
+            count = caches[PAGINATION_COUNT["CACHE"]].get(key)
+            if count is not None:
+                return self.limited(count)
+        count = query.get_count(using=self.object_list.db)
+        if key is not None:
+            caches[PAGINATION_COUNT["CACHE"]].set(
+                key, count, PAGINATION_COUNT["TIMEOUT"]
+            )
+        return self.limited(count)
+
+    def limited(self, count):
+        if self.count_limit is not None and count > self.count_limit:
+            return None
+        return count
+
+    @cached_property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return super().num_pages
+
+    def validate_number(self, number):
+        if self.count is not None:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        if self.count is not None:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom: bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        return UncountedPage(
+            rows[: self.per_page], number, self, len(rows) > self.per_page
+        )
+
+
+class CachedCountPagination(PageNumberPagination):
+    """Постраничный вывод по номеру страницы с дешевым подсчетом записей
+    (CachedCountPaginator).
+
+    Число записей кешируется только для вьюсетов с ConditionalGetMixin:
+    ключ содержит версии данных запроса, поэтому изменения видны сразу,
+    а не после истечения TIMEOUT. С ?count=false записи не считаются,
+    "count" в ответе - null, а ссылка next есть, пока есть записи."""
+
+    django_paginator_class = CachedCountPaginator
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        stamps = getattr(view, "version_stamps", None)
+        paginator = self.django_paginator_class(
+            queryset,
+            page_size,
+            cache_key=None if stamps is None else repr(stamps),
+            count_limit=PAGINATION_COUNT["LIMIT"],
+            counted=request.query_params.get(self.count_query_param)
+            != "false",
+        )
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        if (
+            self.page.has_next() or self.page.has_previous()
+        ) and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+    def get_html_context(self):
+        if self.page.paginator.count is not None:
+            return super().get_html_context()
+        base_url = self.request.build_absolute_uri()
+
+        def page_number_to_url(page_number):
+            if page_number == 1:
+                return remove_query_param(base_url, self.page_query_param)
+            return replace_query_param(
+                base_url, self.page_query_param, page_number
+            )
+
+        current = self.page.number
+        final = current + 1 if self.page.has_next() else current
+        page_numbers = _get_displayed_page_numbers(current, final)
+        return {
+            "previous_url": self.get_previous_link(),
+            "next_url": self.get_next_link(),
+            "page_links": _get_page_links(
+                page_numbers, current, page_number_to_url
+            ),
+        }
+
+
+class OptionalCursorPagination(CachedCountPagination):
+    """Постраничный вывод по номеру страницы.
+    По запросу с ?pagination=cursor или с параметром cursor переключается
+    на пагинацию по курсору: страница N выбирается по индексу
+    (родитель, pub_date) без OFFSET и без подсчета COUNT(*)."""
+
+    mode_query_param = "pagination"
+    cursor_class = PubDateCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        cursor_param = self.cursor_class.cursor_query_param
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or cursor_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class OptionalKeysetPagination(OptionalCursorPagination):
+    """Как OptionalCursorPagination, но курсор строится по текущей
+    сортировке (?ordering=) через KeysetPagination."""
+
+    cursor_class = KeysetPagination
@@ -51,7 +51,7 @@ class AuthorAdminModeratorOrReadOnly(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         return (request.method in permissions.SAFE_METHODS) or (
-            obj.author == request.user
+            obj.author_id == request.user.id
             or request.user.is_moderator
             or request.user.is_admin
         )
@@ -1,15 +1,54 @@
 from django.conf import settings
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.relations import SlugRelatedField
 
 from reviews.models import Category, Comment, Genre, Review, Title
-from users.models import User
+from users.models import ConfirmationCode, User
 
 MESSAGES = getattr(settings, "MESSAGES", None)
+BULK_MAX_SIZE = getattr(settings, "BULK_MAX_SIZE", 500)
 
 
-class UserSerializer(serializers.ModelSerializer):
+def query_list(request, name):
+    """Значения параметра запроса через запятую, без пустых."""
+    value = request.query_params.get(name, "")
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class SparseFieldsSerializerMixin:
+    """Оставляет в ответе на GET запрос только поля из ?fields= или все,
+    кроме полей из ?omit= (имена через запятую). При записи поля не
+    меняются, чтобы не пропустить проверку входных данных."""
+
+    sparse_params = ("fields", "omit")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        selected, omitted = (
+            query_list(request, name) for name in self.sparse_params
+        )
+        unknown = {}
+        for name, values in zip(self.sparse_params, (selected, omitted)):
+            names = [value for value in values if value not in self.fields]
+            if names:
+                unknown[name] = MESSAGES["unknown_fields"].format(
+                    ", ".join(names)
+                )
+        if unknown:
+            raise serializers.ValidationError(unknown)
+        for name in list(self.fields):
+            if (selected and name not in selected) or name in omitted:
+                self.fields.pop(name)
+
+
+class UserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Сериалайзер для Users."""
 
     class Meta:
@@ -25,6 +64,110 @@ class UserSerializer(serializers.ModelSerializer):
         lookup_field = "username"
 
 
+def raw_values(data, field):
+    """Значения поля по строкам входного списка; None, если в строке
+    нет строкового значения."""
+    values = [
+        item.get(field) if isinstance(item, dict) else None for item in data
+    ]
+    return [value if isinstance(value, str) else None for value in values]
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """Список объектов для массового создания.
+
+    Ограничивает размер списка BULK_MAX_SIZE. Проверки, которым нужна
+    БД, выполняются в row_errors сразу для всего списка. Ошибки
+    возвращаются списком, по элементу на каждую строку."""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        if len(data) > BULK_MAX_SIZE:
+            raise serializers.ValidationError(
+                {
+                    "non_field_errors": [
+                        MESSAGES["bulk_too_large"].format(BULK_MAX_SIZE)
+                    ]
+                }
+            )
+        errors = self.row_errors(data)
+        try:
+            rows = super().to_internal_value(data)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError(
+                [{**error, **row} for error, row in zip(errors, exc.detail)]
+            )
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return rows
+
+    def row_errors(self, data):
+        """Ошибки по строкам, найденные запросами ко всему списку."""
+        return [{} for _ in data]
+
+
+class BulkUserListSerializer(BulkListSerializer):
+    """Список пользователей для массового создания. Уникальность
+    username и email проверяется двумя запросами IN."""
+
+    def row_errors(self, data):
+        errors = super().row_errors(data)
+        for field in ("username", "email"):
+            values = raw_values(data, field)
+            taken = set(
+                User.objects.filter(
+                    **{f"{field}__in": [value for value in values if value]}
+                ).values_list(field, flat=True)
+            )
+            seen = set()
+            for error, value in zip(errors, values):
+                if not value:
+                    continue
+                if value in taken or value in seen:
+                    error[field] = [MESSAGES["bulk_duplicate"]]
+                seen.add(value)
+        return errors
+
+    def create(self, validated_data):
+        try:
+            return self.create_users(validated_data)
+        except IntegrityError:
+            # Одновременный запрос занял username или email после проверки.
+            errors = self.row_errors(self.initial_data)
+            if not any(errors):
+                errors = {"non_field_errors": [MESSAGES["bulk_duplicate"]]}
+            raise serializers.ValidationError(errors)
+
+    @transaction.atomic
+    def create_users(self, validated_data):
+        users = [User(**attrs) for attrs in validated_data]
+        for user in users:
+            if user.is_admin:
+                user.is_staff = True
+        User.objects.bulk_create(users)
+        admins = [user.username for user in users if user.is_admin]
+        if admins:
+            User.grant_admin_permissions(
+                User.objects.filter(username__in=admins).values_list(
+                    "id", flat=True
+                )
+            )
+        return users
+
+
+class BulkUserSerializer(UserSerializer):
+    """Строка массового создания пользователей. Проверки уникальности
+    выполняет BulkUserListSerializer."""
+
+    class Meta(UserSerializer.Meta):
+        list_serializer_class = BulkUserListSerializer
+        extra_kwargs = {
+            "username": {"validators": [UnicodeUsernameValidator()]},
+            "email": {"validators": []},
+        }
+
+
 class UserSignupSerializer(serializers.ModelSerializer):
     "Сериалайзер для самостоятельной регистрации пользователей."
 
@@ -44,9 +187,11 @@ class UserConfirmCodeSerializer(serializers.Serializer):
     confirmation_code = serializers.CharField(max_length=64, required=True)
 
     def validate(self, data):
-        """Проверка соответстствия кода логину."""
+        """Проверка соответстствия кода логину. Действующий код
+        погашается, найденный пользователь передается в data["user"]."""
         user = get_object_or_404(User, username=data["username"])
-        if user.confirmation_code == data["confirmation_code"]:
+        if ConfirmationCode.objects.consume(user, data["confirmation_code"]):
+            data["user"] = user
             return data
         raise serializers.ValidationError(MESSAGES["username_or_code_invalid"])
 
@@ -81,24 +226,100 @@ class TitleSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Title
-        fields = "__all__"
+        exclude = ("score_sum", "review_count", "weighted_rating")
+        read_only_fields = ("rating",)
+
+
+class BulkTitleListSerializer(BulkListSerializer):
+    """Список произведений для массового создания. Слаги жанров
+    и категорий всех строк проверяются одним запросом IN на модель."""
+
+    def row_errors(self, data):
+        errors = super().row_errors(data)
+        genres = [
+            item.get("genre") if isinstance(item, dict) else None
+            for item in data
+        ]
+        genres = [
+            [slug for slug in slugs if isinstance(slug, str)]
+            if isinstance(slugs, list)
+            else []
+            for slugs in genres
+        ]
+        categories = raw_values(data, "category")
+        self.genre_ids = dict(
+            Genre.objects.filter(
+                slug__in={slug for slugs in genres for slug in slugs}
+            ).values_list("slug", "id")
+        )
+        self.category_ids = dict(
+            Category.objects.filter(
+                slug__in={slug for slug in categories if slug}
+            ).values_list("slug", "id")
+        )
+        for error, slugs, category in zip(errors, genres, categories):
+            missing = [slug for slug in slugs if slug not in self.genre_ids]
+            if missing:
+                error["genre"] = [
+                    MESSAGES["bulk_no_object"].format(slug) for slug in missing
+                ]
+            if category and category not in self.category_ids:
+                error["category"] = [
+                    MESSAGES["bulk_no_object"].format(category)
+                ]
+        return errors
+
+    def create(self, validated_data):
+        titles = []
+        genre_ids = []
+        for attrs in validated_data:
+            attrs = dict(attrs)
+            genre_ids.append(
+                [self.genre_ids[slug] for slug in set(attrs.pop("genre"))]
+            )
+            category_id = self.category_ids[attrs.pop("category")]
+            titles.append(Title(category_id=category_id, **attrs))
+        return Title.objects.bulk_create_with_genres(titles, genre_ids)
+
+
+class BulkTitleSerializer(serializers.ModelSerializer):
+    """Строка массового создания произведений. Жанры и категория
+    передаются слагами и проверяются в BulkTitleListSerializer."""
+
+    genre = serializers.ListField(child=serializers.SlugField())
+    category = serializers.SlugField()
+
+    class Meta:
+        model = Title
+        fields = ("name", "year", "description", "genre", "category")
+        list_serializer_class = BulkTitleListSerializer
 
 
-class ReadOnlyTitleSerializer(serializers.ModelSerializer):
+class ReadOnlyTitleSerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
     """Сериалайзер для модели Title при действии 'retrieve', 'list.'"""
 
-    rating = serializers.IntegerField(
-        source="reviews__score__avg", read_only=True
-    )
     genre = GenreSerializer(many=True)
     category = CategorySerializer()
 
     class Meta:
         model = Title
-        fields = "__all__"
+        exclude = ("score_sum", "review_count", "weighted_rating")
+
+
+class TopTitleSerializer(ReadOnlyTitleSerializer):
+    """Сериалайзер для списка лучших произведений: добавляет взвешенный
+    рейтинг и число отзывов."""
+
+    class Meta:
+        model = Title
+        exclude = ("score_sum",)
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
     """Serializer for model Review."""
 
     author = SlugRelatedField(slug_field="username", read_only=True)
@@ -114,7 +335,9 @@ class ReviewSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(MESSAGES["duplication_review"])
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
     """Serializer for model Comment."""
 
     author = SlugRelatedField(slug_field="username", read_only=True)
@@ -0,0 +1,112 @@
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+THROTTLE_CACHE = getattr(settings, "THROTTLE_CACHE", "default")
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """Ограничение частоты запросов скользящим окном.
+
+    Вместо списка времен запросов (SimpleRateThrottle) хранит в общем
+    кеше два счетчика: текущего и предыдущего окна длиной duration.
+    Число запросов за последние duration секунд оценивается как счетчик
+    текущего окна плюс доля предыдущего, пропорциональная перекрытию.
+    Запрос сначала увеличивает счетчик текущего окна и проверяет
+    полученное значение, поэтому одновременные запросы не проходят
+    по одному прочитанному значению. Точность счета зависит от cache.incr:
+    в кеше THROTTLE_CACHE (api.cache.LockingDatabaseCache) он выполняется
+    под блокировкой записи. Отклоненный запрос не учитывается."""
+
+    cache = caches[THROTTLE_CACHE]
+
+    def get_ident_value(self, request, view):
+        """Значение, по которому считаются запросы, или None."""
+        raise NotImplementedError(".get_ident_value() must be overridden")
+
+    def get_cache_key(self, request, view):
+        value = self.get_ident_value(request, view)
+        if not value:
+            return None
+        ident = hashlib.md5(value.encode("utf-8")).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        current_key = f"{self.key}_{window}"
+        self.current = self.increment(current_key)
+        self.previous = self.cache.get(f"{self.key}_{window - 1}", 0)
+        self.elapsed = self.now % self.duration
+        if self.estimate(self.elapsed) > self.num_requests:
+            self.current -= 1
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def increment(self, key):
+        """Увеличивает счетчик окна и возвращает новое значение."""
+        if self.cache.add(key, 1, self.duration * 2):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Запись истекла между add и incr.
+            self.cache.set(key, 1, self.duration * 2)
+            return 1
+
+    def estimate(self, elapsed):
+        """Оценка числа запросов за окно, заканчивающееся через elapsed
+        секунд от начала текущего окна."""
+        overlap = 1 - elapsed / self.duration
+        return self.current + self.previous * overlap
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        """Секунды до момента, когда оценка опустится ниже лимита."""
+        wait = self.duration - self.elapsed
+        if self.current < self.num_requests and self.previous:
+            # current + previous * (1 - t / duration) < num_requests
+            allowed_at = self.duration * (
+                1 - (self.num_requests - self.current) / self.previous
+            )
+            wait = min(allowed_at - self.elapsed, wait)
+        return max(1, math.ceil(wait))
+
+
+class AuthIPThrottle(SlidingWindowThrottle):
+    """Запросы регистрации и получения токена с одного IP-адреса."""
+
+    scope = "auth_ip"
+
+    def get_ident_value(self, request, view):
+        return self.get_ident(request)
+
+
+class AuthIdentityThrottle(SlidingWindowThrottle):
+    """Запросы регистрации и получения токена для одного адреса почты
+    (signup) или имени пользователя (token)."""
+
+    scope = "auth_identity"
+
+    def get_ident_value(self, request, view):
+        if not hasattr(request.data, "get"):
+            return None
+        for field in ("email", "username"):
+            value = request.data.get(field)
+            if isinstance(value, str) and value.strip():
+                return f"{field}:{value.strip().lower()}"
+        return None
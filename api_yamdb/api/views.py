@@ -1,25 +1,33 @@
 from django.conf import settings
-from django.core.mail import send_mail
-from django.db.models import Avg
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, status, viewsets
+from rest_framework import filters, generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import AccessToken
 
+from reviews import versions
 from reviews.models import Category, Genre, Review, Title
-from users.models import User
-
-from .filters import TitlesFilter
-from .mixins import ListCreateDestroyViewSet
+from users.models import ConfirmationCode, OutgoingEmail, User
+from users.tokens import RoleAccessToken
+
+from .filters import TitleOrderingFilter, TitlesFilter
+from .mixins import (
+    ConditionalGetMixin,
+    ListCreateDestroyViewSet,
+    SparseFieldsMixin,
+)
+from .pagination import OptionalCursorPagination, OptionalKeysetPagination
 from .serializers import (
+    BulkTitleSerializer,
+    BulkUserSerializer,
     CategorySerializer,
     CommentSerializer,
     GenreSerializer,
     ReadOnlyTitleSerializer,
     ReviewSerializer,
     TitleSerializer,
+    TopTitleSerializer,
     UserConfirmCodeSerializer,
     UserSerializer,
     UserSignupSerializer,
@@ -30,6 +38,7 @@ from .permissions import (
     PostOnlyNoCreate,
     RoleAdminrOrReadOnly,
 )
+from .throttling import AuthIdentityThrottle, AuthIPThrottle
 
 EMAIL_NOREPLAY_ADDRESS = getattr(settings, "EMAIL_NOREPLAY_ADDRESS", None)
 MESSAGES = getattr(settings, "MESSAGES", None)
@@ -41,6 +50,7 @@ class AuthViewSet(viewsets.ModelViewSet):
     пермишенном."""
 
     permission_classes = (PostOnlyNoCreate,)
+    throttle_classes = (AuthIPThrottle, AuthIdentityThrottle)
 
     @action(detail=False, methods=["post"])
     def token(self, request):
@@ -48,10 +58,8 @@ class AuthViewSet(viewsets.ModelViewSet):
 
         serializer = UserConfirmCodeSerializer(data=request.data)
         if serializer.is_valid():
-            user = get_object_or_404(
-                User, username=serializer.data["username"]
-            )
-            access_token = str(AccessToken.for_user(user))
+            user = serializer.validated_data["user"]
+            access_token = str(RoleAccessToken.for_user(user))
             return Response(
                 {"access": access_token}, status=status.HTTP_200_OK
             )
@@ -61,21 +69,23 @@ class AuthViewSet(viewsets.ModelViewSet):
     def signup(self, request):
         """Самостоятельная регистрация нового пользователя.
         Создает пользователя по запросу.
-        Отправляет код подверждения пользователю на email.
-        Отправляет код подверждения на email существующим пользователям."""
+        Ставит в очередь письмо с кодом подверждения пользователю.
+        Ставит в очередь письмо с кодом существующим пользователям."""
 
         serializer = UserSignupSerializer(data=request.data)
         if serializer.is_valid():
-            self.perform_create(serializer)
+            with transaction.atomic():
+                user = serializer.save()
+                self.queue_mail_code(user)
         else:
-            if (
-                "username" in serializer.data
-                and User.objects.filter(
+            user = None
+            if "username" in serializer.data:
+                user = User.objects.filter(
                     username=serializer.data["username"],
                     email=serializer.data["email"],
-                ).exists()
-            ):
-                self.send_mail_code(serializer.data)
+                ).first()
+            if user is not None:
+                self.queue_mail_code(user)
                 return Response(
                     {"detail": MESSAGES["mail_send"]},
                     status=status.HTTP_200_OK,
@@ -83,27 +93,26 @@ class AuthViewSet(viewsets.ModelViewSet):
             return Response(
                 serializer.errors, status=status.HTTP_400_BAD_REQUEST
             )
-        self.send_mail_code(serializer.data)
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_200_OK, headers=headers
         )
 
-    def send_mail_code(self, data):
-        """Функция отправки кода подтверждения."""
-
-        user = get_object_or_404(User, username=data["username"])
-        result = send_mail(
-            MESSAGES["mail_theme"],
-            MESSAGES["mail_text"].format(user.confirmation_code),
-            EMAIL_NOREPLAY_ADDRESS,
-            [data["email"]],
-            fail_silently=False,
+    @transaction.atomic
+    def queue_mail_code(self, user):
+        """Выдает новый код подтверждения и ставит письмо с ним в очередь
+        отправки. Письмо отправляет команда sendoutbox."""
+
+        code = ConfirmationCode.objects.issue(user)
+        return OutgoingEmail.objects.create(
+            recipient=user.email,
+            subject=MESSAGES["mail_theme"],
+            body=MESSAGES["mail_text"].format(code),
+            from_email=EMAIL_NOREPLAY_ADDRESS,
         )
-        return result
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """ViewSet API управления пользователями.
     Запросы к экземпляру осуществляются по username.
     При обращении на /me/ пользователь дополняет/получает свою запись."""
@@ -113,20 +122,31 @@ class UserViewSet(viewsets.ModelViewSet):
     permission_classes = (MeOrAdmin,)
     lookup_field = "username"
 
+    @staticmethod
+    def user_lookup(request, username):
+        """Условие поиска пользователя. На /me/ пользователь ищется по id
+        из токена: имя в токене могло принадлежать переименованной записи."""
+
+        if username == "me":
+            return {"pk": request.user.id}
+        return {"username": username}
+
     def retrieve(self, request, username=None):
         """Получение экземпляра пользователя по username.
         При запросе на /me/ возвращает авторизованного пользователя."""
 
-        if username == "me":
-            username = request.user.username
-        user = get_object_or_404(self.queryset, username=username)
-        serializer = UserSerializer(user)
+        user = get_object_or_404(
+            self.filter_queryset(self.get_queryset()),
+            **self.user_lookup(request, username),
+        )
+        serializer = self.get_serializer(user)
         return Response(serializer.data)
 
     def partial_update(self, request, username=None):
         """Обновление экземпляра пользователя по username.
         Не позволяет установить непредусмотренную роль.
-        Если пользователь не админ, не позволяет сменить роль."""
+        Если пользователь не админ, не позволяет сменить роль.
+        Смена роли делает недействительными выданные токены."""
 
         data = request.data.copy()
         if "role" in data:
@@ -137,11 +157,25 @@ class UserViewSet(viewsets.ModelViewSet):
                 )
             if not request.user.is_admin:
                 data.pop("role")
-        serializer = UserSerializer(request.user, data=data, partial=True)
+        user = get_object_or_404(
+            self.queryset, **self.user_lookup(request, username)
+        )
+        serializer = UserSerializer(user, data=data, partial=True)
         if serializer.is_valid():
             serializer.save()
         return Response(serializer.data)
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Массовое создание пользователей из списка.
+        Ошибки проверки возвращаются списком по строкам, при ошибках
+        ни один пользователь не создается."""
+
+        serializer = BulkUserSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     def destroy(self, request, username=None):
         """Удаление пользователя.
         Не позволяет удалить самого себя при запросе на /me/."""
@@ -159,6 +193,7 @@ class UserViewSet(viewsets.ModelViewSet):
 class CategoryViewSet(ListCreateDestroyViewSet):
     """API для работы с моделью категорий."""
 
+    version_names = ("category",)
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = (RoleAdminrOrReadOnly,)
@@ -170,6 +205,7 @@ class CategoryViewSet(ListCreateDestroyViewSet):
 class GenreViewSet(ListCreateDestroyViewSet):
     """API для работы с моделью жанров."""
 
+    version_names = ("genre",)
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
     permission_classes = (RoleAdminrOrReadOnly,)
@@ -178,79 +214,139 @@ class GenreViewSet(ListCreateDestroyViewSet):
     lookup_field = "slug"
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(
+    ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet
+):
     """API для работы произведений."""
 
-    queryset = (
-        Title.objects.all().annotate(Avg("reviews__score")).order_by("name")
-    )
+    version_names = ("title",)
+    queryset = Title.objects.all().order_by("name", "year")
     permission_classes = (RoleAdminrOrReadOnly,)
-    filter_backends = [DjangoFilterBackend]
+    pagination_class = OptionalKeysetPagination
+    filter_backends = [DjangoFilterBackend, TitleOrderingFilter]
     filterset_class = TitlesFilter
+    ordering_fields = ("name", "year", "rating", "review_count")
+    ordering = ("name", "year")
     http_method_names = ["get", "post", "delete", "patch"]
 
+    def get_queryset(self):
+        if self.action in ("retrieve", "list", "top"):
+            return self.queryset.select_related("category").prefetch_related(
+                "genre"
+            )
+        return self.queryset
+
     def get_serializer_class(self):
         if self.action in ("retrieve", "list"):
             return ReadOnlyTitleSerializer
+        if self.action == "top":
+            return TopTitleSerializer
+        if self.action == "bulk":
+            return BulkTitleSerializer
         return TitleSerializer
 
+    def get_version_names(self):
+        if self.action == "stats":
+            pk = self.kwargs.get("pk")
+            return (versions.reviews(pk),) if pk.isdigit() else ()
+        return self.version_names
+
+    @action(detail=False, methods=["get"])
+    def top(self, request):
+        """Лучшие произведения по взвешенному рейтингу, с теми же
+        фильтрами, что и список (genre, category, year и другие).
+        Произведения без отзывов не попадают в список."""
+
+        def build():
+            queryset = (
+                self.filter_queryset(self.get_queryset())
+                .filter(weighted_rating__isnull=False)
+                .order_by("-weighted_rating", "-id")
+            )
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data).data
+
+        return Response(self.cached("top", build))
 
-class ReviewViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=["get"])
+    def stats(self, request, pk=None):
+        """Распределение оценок произведения: число отзывов, среднее,
+        медиана и гистограмма оценок 1-10. Кешируется до изменения
+        отзывов произведения."""
+
+        def build():
+            # generics.get_object_or_404 отвечает 404 и на нечисловой pk.
+            generics.get_object_or_404(Title, pk=pk)
+            return Title.score_stats(pk)
+
+        return Response(self.cached("stats", build))
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Массовое создание произведений из списка.
+        Ошибки проверки возвращаются списком по строкам, при ошибках
+        ни одно произведение не создается."""
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        titles = serializer.save()
+        queryset = self.queryset.filter(
+            pk__in=[title.pk for title in titles]
+        ).select_related("category").prefetch_related("genre")
+        return Response(
+            ReadOnlyTitleSerializer(queryset, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class ReviewViewSet(
+    ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet
+):
     """Class api for model Review."""
 
     serializer_class = ReviewSerializer
     permission_classes = [AuthorAdminModeratorOrReadOnly]
+    pagination_class = OptionalCursorPagination
     http_method_names = ["get", "post", "delete", "patch"]
 
+    def get_version_names(self):
+        return (versions.reviews(self.kwargs.get("title_id")),)
+
     def get_queryset(self):
         title = get_object_or_404(Title, pk=self.kwargs.get("title_id"))
-        return title.reviews.all()
+        return title.reviews.select_related("author")
 
     def perform_create(self, serializer):
         title = get_object_or_404(Title, pk=self.kwargs.get("title_id"))
-        review = Review.objects.filter(author=self.request.user, title=title)
+        review = Review.objects.filter(
+            author_id=self.request.user.id, title=title
+        )
         serializer.check_only_one_review(review)
-        serializer.save(author=self.request.user, title=title)
+        serializer.save(author_id=self.request.user.id, title=title)
 
-        title.rating = title.reviews.all().aggregate(Avg("score"))[
-            "score__avg"
-        ]
-        title.save()
 
-    def perform_update(self, serializer):
-        title = get_object_or_404(Title, pk=self.kwargs.get("title_id"))
-        serializer.save()
-
-        title.rating = title.reviews.all().aggregate(Avg("score"))[
-            "score__avg"
-        ]
-        title.save()
-
-    def perform_destroy(self, instance):
-        title = get_object_or_404(Title, pk=self.kwargs.get("title_id"))
-        instance.delete()
-
-        title.rating = title.reviews.all().aggregate(Avg("score"))[
-            "score__avg"
-        ]
-        title.save()
-
-
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(
+    ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet
+):
     """Class api for model Comment."""
 
     serializer_class = CommentSerializer
     permission_classes = [AuthorAdminModeratorOrReadOnly]
+    pagination_class = OptionalCursorPagination
     http_method_names = ["get", "post", "delete", "patch"]
 
+    def get_version_names(self):
+        return (versions.reviews(self.kwargs.get("title_id")),)
+
     def get_queryset(self):
         title = get_object_or_404(Title, pk=self.kwargs.get("title_id"))
         review = get_object_or_404(
             Review, pk=self.kwargs.get("review_id"), title=title
         )
-        return review.comments.all()
+        return review.comments.select_related("author")
 
     def perform_create(self, serializer):
         get_object_or_404(Title, pk=self.kwargs.get("title_id"))
         review = get_object_or_404(Review, pk=self.kwargs.get("review_id"))
-        serializer.save(author=self.request.user, review=review)
+        serializer.save(author_id=self.request.user.id, review=review)
@@ -19,7 +19,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "rest_framework",
-    "reviews",
+    "reviews.apps.ReviewsConfig",
     "api",
 ]
 
@@ -98,13 +98,17 @@ AUTH_USER_MODEL = "users.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.RoleJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.CachedCountPagination",
     "PAGE_SIZE": 5,
+    "DEFAULT_THROTTLE_RATES": {
+        "auth_ip": "30/min",
+        "auth_identity": "5/min",
+    },
 }
 
 SIMPLE_JWT = {
@@ -112,11 +116,86 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
-EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+# Кеш в БД общий для всех процессов сервера; таблицу создает команда
+# createcachetable.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "yamdb_cache",
+    },
+    # Счетчики ограничения частоты запросов в отдельной таблице: при
+    # переполнении кеш удаляет часть записей, и вытеснение счетчиков
+    # записями других кешей сбрасывало бы ограничения.
+    "throttle": {
+        "BACKEND": "api.cache.LockingDatabaseCache",
+        "LOCATION": "yamdb_throttle",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+    # Версии данных: по записи на каждое произведение с отзывами, поэтому
+    # таблица своя и большая, иначе вытеснение сбрасывало бы версии.
+    "versions": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "yamdb_versions",
+        "OPTIONS": {"MAX_ENTRIES": 1000000},
+    },
+}
+
+# Алиас кеша счетчиков ограничения частоты запросов signup и token.
+THROTTLE_CACHE = "throttle"
+
+# Алиас кеша версий данных для заголовков ETag и Last-Modified.
+VERSION_CACHE = "versions"
+
+# Кеш ответов списков категорий и жанров в памяти процесса; ключ
+# содержит версию данных, поэтому изменения видны сразу.
+RESPONSE_CACHE = "default"
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Подсчет записей для постраничного вывода: кеш числа записей на время
+# TIMEOUT секунд (ключ содержит фильтры и версии данных) и предел LIMIT,
+# больше которого записи не считаются и ответ содержит "count": null
+# (None - считать всегда).
+PAGINATION_COUNT = {
+    "CACHE": "default",
+    "TIMEOUT": 60,
+    "LIMIT": 10000,
+}
+
+# Кеш пользователей для аутентификации запросов: размер LRU в памяти
+# процесса, время жизни записи в секундах и алиас общего кеша из CACHES
+# (None - только кеш процесса). Версии токенов хранятся только в общем
+# кеше TOKEN_VERSION_CACHE, чтобы отзыв токенов действовал во всех
+# процессах сразу.
+USER_CACHE = {
+    "MAX_SIZE": 1024,
+    "TIMEOUT": 60,
+    "SHARED_CACHE": "shared",
+    "TOKEN_VERSION_CACHE": "shared",
+}
+
+EMAIL_BACKEND = "users.mail.ShardedFileEmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
+EMAIL_FILE_MAX_SIZE = 10 * 1024 * 1024
 
 EMAIL_NOREPLAY_ADDRESS = "noreplay@yamdb.team3"
 
+CONFIRMATION_CODE_LENGTH = 24
+CONFIRMATION_CODE_TTL = timedelta(hours=1)
+
+# Взвешенный рейтинг для /titles/top/: к оценкам произведения добавляется
+# MIN_REVIEWS отзывов со средней оценкой всех произведений. Средняя
+# оценка хранится в кеше CACHE и обновляется командой recountratings.
+WEIGHTED_RATING = {
+    "MIN_REVIEWS": 10,
+    "CACHE": "shared",
+}
+
+# Наибольшее число строк в одном запросе массового создания.
+BULK_MAX_SIZE = 500
+
 MESSAGES = {
     "mail_send": "Email with confirmation code sent",
     "mail_text": "Welcome!\nYour verification code YaMDB {}" "\n\nYaMDB team.",
@@ -127,4 +206,8 @@ MESSAGES = {
     "username_or_code_invalid": "Invalid username or code",
     "duplication_review": "You have already written a review for this title",
     "no_valid_year": "Unable to specify a year in the future",
+    "bulk_too_large": "No more than {} items per request",
+    "bulk_duplicate": "This value is already taken",
+    "bulk_no_object": "Object with slug={} does not exist",
+    "unknown_fields": "Unknown fields: {}",
 }
@@ -1,102 +1,593 @@
 import csv
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import Manager
 
-import django.db.utils
-from django.core.management.base import BaseCommand
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
-from reviews.models import Genre, Category, Title, Review, Comment
+from reviews import versions
+from reviews.models import (
+    Category,
+    Comment,
+    Genre,
+    ImportedRow,
+    Review,
+    Title,
+)
+from users.cache import token_version_cache, user_cache
 from users.models import User
 
+DATA_DIR = "static/data"
+# Сколько разобранных пачек одного файла может ждать записи.
+QUEUE_SIZE = 4
+# Размер IN запроса для СУБД без ограничения на число параметров.
+IN_CHUNK_SIZE = 1000
+GenreTitle = Title.genre.through
+
+# filename - имя файла в каталоге данных, по нему же определяется таблица
+# для явно переданных путей; foreign_keys - поля, значения которых должны
+# существовать в связанной таблице; update_fields - поля, которые
+# обновляются у существующих записей в режиме --upsert.
+Table = namedtuple(
+    "Table",
+    ("filename", "model", "make_object", "foreign_keys", "update_fields"),
+)
+# Разобранная строка файла: позиция после нее, объект модели (None, если
+# строку не удалось разобрать), значение столбца id и хеш содержимого.
+ParsedRow = namedtuple("ParsedRow", ("position", "obj", "key", "digest"))
+
+
+def make_user(row):
+    return User(
+        pk=int(row["id"]),
+        username=row["username"],
+        email=row["email"],
+        role=row["role"],
+        is_staff=row["role"] == User.ADMIN,
+        bio=row["bio"],
+        first_name=row["first_name"],
+        last_name=row["last_name"],
+    )
+
+
+def make_genre(row):
+    return Genre(pk=int(row["id"]), name=row["name"], slug=row["slug"])
+
+
+def make_category(row):
+    return Category(pk=int(row["id"]), name=row["name"], slug=row["slug"])
+
+
+def make_title(row):
+    return Title(
+        pk=int(row["id"]),
+        name=row["name"],
+        year=int(row["year"]),
+        category_id=int(row["category"]),
+    )
+
+
+def make_genre_title(row):
+    return GenreTitle(
+        pk=int(row["id"]),
+        title_id=int(row["title_id"]),
+        genre_id=int(row["genre_id"]),
+    )
+
+
+def make_review(row):
+    return Review(
+        pk=int(row["id"]),
+        title_id=int(row["title_id"]),
+        author_id=int(row["author"]),
+        text=row["text"],
+        score=int(row["score"]),
+        pub_date=row["pub_date"],
+    )
+
+
+def make_comment(row):
+    return Comment(
+        pk=int(row["id"]),
+        review_id=int(row["review_id"]),
+        author_id=int(row["author"]),
+        text=row["text"],
+        pub_date=row["pub_date"],
+    )
+
+
+# Файлы в порядке зависимостей по внешним ключам.
+TABLES = (
+    Table(
+        "users.csv",
+        User,
+        make_user,
+        {},
+        (
+            "username",
+            "email",
+            "role",
+            "is_staff",
+            "bio",
+            "first_name",
+            "last_name",
+            "token_version",
+        ),
+    ),
+    Table("genre.csv", Genre, make_genre, {}, ("name", "slug")),
+    Table("category.csv", Category, make_category, {}, ("name", "slug")),
+    Table(
+        "titles.csv",
+        Title,
+        make_title,
+        {"category_id": Category},
+        ("name", "year", "category"),
+    ),
+    Table(
+        "genre_title.csv",
+        GenreTitle,
+        make_genre_title,
+        {"title_id": Title, "genre_id": Genre},
+        (),
+    ),
+    Table(
+        "review.csv",
+        Review,
+        make_review,
+        {"title_id": Title, "author_id": User},
+        ("title", "author", "text", "score"),
+    ),
+    Table(
+        "comments.csv",
+        Comment,
+        make_comment,
+        {"review_id": Review, "author_id": User},
+        ("review", "author", "text"),
+    ),
+)
+
+
+def read_rows(path, position=0):
+    """Читает CSV по одной записи. Вместе с записью отдает позицию в файле
+    сразу после нее, с которой загрузку можно продолжить."""
+    with open(path, "rb") as csvfile:
+        lines = (line.decode("utf-8") for line in iter(csvfile.readline, b""))
+        header = next(csv.reader(lines))
+        if position:
+            csvfile.seek(position)
+        for values in csv.reader(lines):
+            yield csvfile.tell(), dict(zip(header, values))
+
+
+def row_digest(row):
+    """Хеш содержимого записи для обнаружения изменений."""
+    content = "\x1f".join(row.values()).encode("utf-8")
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def validate_rows(rows, make_object):
+    """Превращает записи в объекты модели. Для записей, которые не
+    удалось разобрать, вместо объекта отдает None."""
+    for position, row in rows:
+        try:
+            obj = make_object(row)
+        except (KeyError, TypeError, ValueError):
+            obj = None
+        yield ParsedRow(position, obj, row.get("id"), row_digest(row))
+
+
+def batches(iterable, size):
+    """Разбивает поток на списки длиной не больше size."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_batches(path, position, make_object, batch_size):
+    """Чтение, проверка и разбиение одного файла на пачки."""
+    return batches(
+        validate_rows(read_rows(path, position), make_object), batch_size
+    )
+
+
+def parse_to_queue(queue, path, position, make_object, batch_size):
+    """Выполняется в дочернем процессе: разбирает файл и передает пачки
+    через очередь. Очередь ограничена, поэтому процесс ждет, пока пачки
+    не будут записаны. Конец файла или ошибка отмечаются значением None."""
+    try:
+        for batch in parse_batches(path, position, make_object, batch_size):
+            queue.put(batch)
+    finally:
+        queue.put(None)
+
+
+def dependency_stages(tables):
+    """Разбивает пары (таблица, путь) на этапы по графу внешних ключей:
+    таблицы этапа зависят только от таблиц предыдущих этапов."""
+    remaining = list(tables)
+    stages = []
+    while remaining:
+        present = {table.model for table, _ in remaining}
+        stage = [
+            (table, path)
+            for table, path in remaining
+            if not (set(table.foreign_keys.values()) & present)
+        ]
+        if not stage:
+            raise CommandError("Циклическая зависимость между файлами данных")
+        stages.append(stage)
+        remaining = [item for item in remaining if item not in stage]
+    return stages
+
+
+def in_chunks(values):
+    """Разбивает значения для IN запросов по ограничению СУБД на
+    количество параметров запроса (без ограничения - по IN_CHUNK_SIZE)."""
+    values = list(values)
+    size = (connection.features.max_query_params or IN_CHUNK_SIZE) - 1
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def existing_ids(model, ids):
+    """Возвращает ту часть ids, для которой есть записи в таблице model."""
+    found = set()
+    for chunk in in_chunks(ids):
+        found.update(
+            model.objects.filter(pk__in=chunk).values_list("pk", flat=True)
+        )
+    return found
+
+
+def drop_orphans(rows, foreign_keys):
+    """Отбрасывает строки, объекты которых ссылаются на несуществующие
+    записи. Выполняет один IN запрос на каждый внешний ключ пачки."""
+    for attname, model in foreign_keys.items():
+        found = existing_ids(
+            model, {getattr(row.obj, attname) for row in rows}
+        )
+        rows = [row for row in rows if getattr(row.obj, attname) in found]
+    return rows
+
+
+def changed_rows(filename, rows):
+    """Оставляет строки, хеш которых отличается от сохраненного
+    при прошлой загрузке."""
+    digests = {}
+    for chunk in in_chunks(row.key for row in rows):
+        digests.update(
+            ImportedRow.objects.filter(
+                table=filename, row_id__in=chunk
+            ).values_list("row_id", "digest")
+        )
+    return [row for row in rows if digests.get(row.key) != row.digest]
+
+
+def carry_token_versions(users):
+    """bulk_update не вызывает User.save: переносит в объекты версии
+    токенов и is_superuser из БД и увеличивает версию тем, у кого
+    изменились данные токена, чтобы старые токены перестали действовать."""
+    by_id = {user.pk: user for user in users}
+    for chunk in in_chunks(by_id):
+        for stored in User.objects.filter(pk__in=chunk):
+            user = by_id[stored.pk]
+            user.is_superuser = stored.is_superuser
+            user.token_version = stored.token_version
+            if user.access_claims() != stored.access_claims():
+                user.token_version += 1
+
+
+def relinked_titles(rows):
+    """Произведения, связи которых меняют строки genre_title.csv: из
+    новых значений строк и, по id строки, из прежних."""
+    titles = {row.obj.title_id for row in rows}
+    for chunk in in_chunks(row.obj.pk for row in rows):
+        titles.update(
+            GenreTitle.objects.filter(pk__in=chunk).values_list(
+                "title_id", flat=True
+            )
+        )
+    return titles
+
+
+def link_changes(path, title_ids):
+    """Сравнивает связи произведений title_ids с жанрами в БД и в файле
+    genre_title.csv. Возвращает id лишних связей и недостающие пары
+    (title_id, genre_id). Файл читается потоком еще раз, в памяти
+    только связи этих произведений."""
+    links = {
+        (row.obj.title_id, row.obj.genre_id)
+        for row in validate_rows(read_rows(path), make_genre_title)
+        if row.obj is not None and row.obj.title_id in title_ids
+    }
+    stale = []
+    for chunk in in_chunks(title_ids):
+        for pk, title_id, genre_id in GenreTitle.objects.filter(
+            title_id__in=chunk
+        ).values_list("pk", "title_id", "genre_id"):
+            if (title_id, genre_id) in links:
+                links.remove((title_id, genre_id))
+            else:
+                stale.append(pk)
+    return stale, links
+
+
+def save_digests(filename, rows):
+    for chunk in in_chunks(row.key for row in rows):
+        ImportedRow.objects.filter(table=filename, row_id__in=chunk).delete()
+    ImportedRow.objects.bulk_create(
+        ImportedRow(table=filename, row_id=row.key, digest=row.digest)
+        for row in rows
+    )
+
+
+class Checkpoint:
+    """Позиции загруженных файлов в JSON файле. Сохраняется после каждой
+    записанной пачки, чтобы прерванную загрузку можно было продолжить."""
+
+    def __init__(self, path):
+        self.path = path
+        self.positions = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as checkpoint_file:
+                self.positions = json.load(checkpoint_file)
+
+    def get(self, filename):
+        return self.positions.get(filename, 0)
+
+    def save(self, filename, position):
+        if not self.path:
+            return
+        self.positions[filename] = position
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(self.positions, checkpoint_file)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
 
 class Command(BaseCommand):
+    help = (
+        "Загружает данные из CSV файлов в базу данных. Файлы читаются "
+        "потоком и записываются пачками, память не зависит от их размера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "files",
+            nargs="*",
+            help="Пути к CSV файлам. Таблица определяется по имени файла "
+            "(users.csv, review.csv, ...). По умолчанию все файлы "
+            "из --data-dir.",
+        )
+        parser.add_argument(
+            "--data-dir",
+            default=DATA_DIR,
+            help="Каталог с CSV файлами.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество строк в одном INSERT.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Количество процессов для разбора файлов. "
+            "0 - разбирать файлы в основном процессе.",
+        )
+        parser.add_argument(
+            "--upsert",
+            action="store_true",
+            help="Обновлять измененные записи. Строки, не изменившиеся "
+            "с прошлой загрузки, пропускаются без обращения к таблице.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Файл с позициями загрузки. Каждая пачка фиксируется "
+            "отдельной транзакцией, повторный запуск продолжает загрузку "
+            "с сохраненной позиции.",
+        )
+
     def handle(self, *args, **options):
-        with open("static/data/users.csv", "r", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                User.objects.get_or_create(
-                    pk=row["id"],
-                    defaults={
-                        "username": row["username"],
-                        "email": row["email"],
-                        "role": row["role"],
-                        "bio": row["bio"],
-                        "first_name": row["first_name"],
-                        "last_name": row["last_name"],
-                    },
-                )
+        self.batch_size = options["batch_size"]
+        self.workers = options["workers"]
+        self.upsert = options["upsert"]
+        self.written = set()
+        self.relinked = set()
+        tables = self.get_tables(options["files"], options["data_dir"])
+        self.checkpoint = Checkpoint(options["checkpoint"])
+        if options["checkpoint"]:
+            self.load(tables)
+        else:
+            with transaction.atomic():
+                self.load(tables)
+        self.checkpoint.clear()
 
-        with open("static/data/genre.csv", "r", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                Genre.objects.get_or_create(
-                    pk=row["id"],
-                    defaults={
-                        "name": row["name"],
-                        "slug": row["slug"],
-                    },
-                )
+    def get_tables(self, files, data_dir):
+        """Возвращает пары (таблица, путь) в порядке зависимостей."""
+        if not files:
+            return [
+                (table, os.path.join(data_dir, table.filename))
+                for table in TABLES
+            ]
+        paths = {os.path.basename(path): path for path in files}
+        unknown = set(paths) - {table.filename for table in TABLES}
+        if unknown:
+            raise CommandError(
+                f"Неизвестные файлы данных: {', '.join(sorted(unknown))}"
+            )
+        return [
+            (table, paths[table.filename])
+            for table in TABLES
+            if table.filename in paths
+        ]
 
-        with open(
-            "static/data/category.csv", "r", encoding="utf-8"
-        ) as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                Category.objects.get_or_create(
-                    pk=row["id"],
-                    defaults={
-                        "name": row["name"],
-                        "slug": row["slug"],
-                    },
+    def load(self, tables):
+        """Разбирает файлы параллельно, а записывает в порядке
+        зависимостей между таблицами."""
+        stages = dependency_stages(tables)
+        if self.workers:
+            with ProcessPoolExecutor(
+                self.workers, initializer=django.setup
+            ) as pool, Manager() as manager:
+                sources = {}
+                for stage in stages:
+                    for table, path in stage:
+                        queue = manager.Queue(QUEUE_SIZE)
+                        future = pool.submit(
+                            parse_to_queue,
+                            queue,
+                            path,
+                            self.checkpoint.get(table.filename),
+                            table.make_object,
+                            self.batch_size,
+                        )
+                        sources[table.filename] = (
+                            iter(queue.get, None),
+                            future,
+                        )
+                self.write_stages(stages, sources)
+        else:
+            sources = {
+                table.filename: (
+                    parse_batches(
+                        path,
+                        self.checkpoint.get(table.filename),
+                        table.make_object,
+                        self.batch_size,
+                    ),
+                    None,
                 )
-
-        with open("static/data/titles.csv", "r", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                Title.objects.get_or_create(
-                    pk=row["id"],
-                    defaults={
-                        "name": row["name"],
-                        "year": row["year"],
-                        "category": Category.objects.get(pk=row["category"]),
-                    },
+                for stage in stages
+                for table, path in stage
+            }
+            self.write_stages(stages, sources)
+        loaded = {table.model for table, _ in tables}
+        if User in loaded:
+            User.grant_admin_permissions(
+                User.objects.filter(role=User.ADMIN).values_list(
+                    "id", flat=True
                 )
+            )
+        if Review in loaded and (not self.upsert or Review in self.written):
+            Title.recount_scores()
+        versions.bump_all()
+
+    def write_stages(self, stages, sources):
+        for number, stage in enumerate(stages, 1):
+            started = time.monotonic()
+            for table, path in stage:
+                parsed, future = sources[table.filename]
+                self.write_table(table, parsed)
+                if future is not None:
+                    future.result()
+                if self.upsert and table.model is GenreTitle:
+                    self.sync_links(path)
+            self.stdout.write(
+                f"stage {number} "
+                f"({', '.join(table.filename for table, _ in stage)}): "
+                f"{time.monotonic() - started:.2f}s"
+            )
 
-        with open(
-            "static/data/genre_title.csv", "r", encoding="utf-8"
-        ) as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                try:
-                    Genre.objects.get(pk=row["genre_id"]).titles.add(
-                        row["title_id"]
+    def write_table(self, table, parsed):
+        """Записывает пачки одного файла. Записи со ссылками на
+        несуществующие объекты пропускаются, существующие записи
+        пропускаются или, в режиме --upsert, обновляются."""
+        started = time.monotonic()
+        rows = skipped = written = 0
+        for batch in parsed:
+            valid = drop_orphans(
+                [row for row in batch if row.obj is not None],
+                table.foreign_keys,
+            )
+            skipped += len(batch) - len(valid)
+            if self.upsert:
+                valid = changed_rows(table.filename, valid)
+                if table.model is GenreTitle:
+                    self.relinked.update(relinked_titles(valid))
+            with transaction.atomic():
+                if self.upsert:
+                    self.upsert_rows(table, valid)
+                else:
+                    table.model.objects.bulk_create(
+                        [row.obj for row in valid],
+                        batch_size=self.batch_size,
+                        ignore_conflicts=True,
                     )
-                except django.db.utils.IntegrityError:
-                    continue
-
-        with open("static/data/review.csv", "r", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                Review.objects.get_or_create(
-                    pk=row["id"],
-                    defaults={
-                        "text": row["text"],
-                        "author": User.objects.get(pk=row["author"]),
-                        "score": row["score"],
-                        "pub_date": row["pub_date"],
-                        "title": Title.objects.get(pk=row["title_id"]),
-                    },
-                )
+            self.checkpoint.save(table.filename, batch[-1].position)
+            rows += len(batch)
+            written += len(valid)
+        if written:
+            self.written.add(table.model)
+        elapsed = time.monotonic() - started
+        changed = f"{written} changed, " if self.upsert else ""
+        self.stdout.write(
+            f"{table.filename}: {rows} rows, {skipped} skipped, {changed}"
+            f"{rows / elapsed if elapsed else rows:.0f} rows/s"
+        )
 
-        with open(
-            "static/data/comments.csv", "r", encoding="utf-8"
-        ) as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                Comment.objects.get_or_create(
-                    pk=row["id"],
-                    defaults={
-                        "review": Review.objects.get(pk=row["review_id"]),
-                        "author": User.objects.get(pk=row["author"]),
-                        "text": row["text"],
-                        "pub_date": row["pub_date"],
-                    },
-                )
+    def upsert_rows(self, table, rows):
+        """Обновляет существующие записи и создает новые."""
+        if not rows:
+            return
+        objects = [row.obj for row in rows]
+        existing = set()
+        if table.update_fields:
+            existing = existing_ids(table.model, [obj.pk for obj in objects])
+            updated = [obj for obj in objects if obj.pk in existing]
+            if table.model is User:
+                carry_token_versions(updated)
+            table.model.objects.bulk_update(
+                updated, table.update_fields, batch_size=self.batch_size
+            )
+        if table.model is User:
+            for user_id in existing:
+                user_cache.invalidate(user_id)
+                token_version_cache.invalidate(user_id)
+        table.model.objects.bulk_create(
+            [obj for obj in objects if obj.pk not in existing],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        save_digests(table.filename, rows)
+
+    def sync_links(self, path):
+        """Приводит связи с жанрами произведений с измененными строками
+        genre_title.csv к содержимому файла: строка с тем же id могла
+        перенести связь к другому произведению или жанру."""
+        if not self.relinked:
+            return
+        stale, missing = link_changes(path, self.relinked)
+        with transaction.atomic():
+            for chunk in in_chunks(stale):
+                GenreTitle.objects.filter(pk__in=chunk).delete()
+            GenreTitle.objects.bulk_create(
+                [
+                    GenreTitle(title_id=title_id, genre_id=genre_id)
+                    for title_id, genre_id in missing
+                ],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+        if stale or missing:
+            self.written.add(GenreTitle)
+        self.stdout.write(
+            f"genre_title.csv: {len(stale)} stale links removed, "
+            f"{len(missing)} restored"
+        )
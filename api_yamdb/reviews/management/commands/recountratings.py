@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from reviews import versions
+from reviews.models import Title
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает взвешенный рейтинг произведений по текущей средней "
+        "оценке. Запускается периодически."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересчитать также суммы оценок и число отзывов.",
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            Title.recount_scores()
+        else:
+            Title.recount_weighted_ratings()
+        versions.bump("title")
+        self.stdout.write(f"rating prior: {Title.rating_prior():.3f}")
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:39
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_score_counters(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    Title = apps.get_model('reviews', 'Title')
+    stats = Review.objects.values('title').annotate(
+        score_sum=Sum('score'), review_count=Count('id')
+    ).order_by()
+    for row in stats:
+        Title.objects.filter(pk=row['title']).update(
+            score_sum=row['score_sum'],
+            review_count=row['review_count'],
+            rating=row['score_sum'] // row['review_count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_auto_20220512_1833'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Количество отзывов на произведение', verbose_name='Количество отзывов'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='score_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Сумма оценок всех отзывов на произведение', verbose_name='Сумма оценок'),
+        ),
+        migrations.RunPython(fill_score_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0007_pub_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedRow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(help_text='Имя файла, из которого загружена строка', max_length=64, verbose_name='Таблица')),
+                ('row_id', models.CharField(help_text='Значение столбца id строки', max_length=64, verbose_name='Идентификатор строки')),
+                ('digest', models.CharField(help_text='Хеш содержимого строки', max_length=32, verbose_name='Хеш строки')),
+            ],
+            options={
+                'verbose_name': 'Загруженная строка',
+                'verbose_name_plural': 'Загруженные строки',
+                'unique_together': {('table', 'row_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+import reviews.search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0008_importedrow'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            reviews.search.create_title_index,
+            reviews.search.drop_title_index,
+        ),
+    ]
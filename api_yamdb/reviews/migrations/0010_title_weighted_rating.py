@@ -0,0 +1,57 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, FloatField, Sum, Value
+from django.db.models.functions import NullIf
+
+import reviews.search
+
+
+def fill_weighted_rating(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    totals = Title.objects.aggregate(
+        score_sum=Sum('score_sum'), review_count=Sum('review_count')
+    )
+    prior = (
+        totals['score_sum'] / totals['review_count']
+        if totals['review_count'] else 0.0
+    )
+    weight = getattr(settings, 'WEIGHTED_RATING', {}).get('MIN_REVIEWS', 10)
+    Title.objects.update(
+        weighted_rating=ExpressionWrapper(
+            (F('score_sum') + Value(float(weight * prior)))
+            / (NullIf(F('review_count'), 0) + weight),
+            output_field=FloatField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0009_title_search_index'),
+    ]
+
+    operations = [
+        # Reversing AddField rebuilds reviews_title as well; this operation
+        # is reversed last and restores the triggers.
+        migrations.RunPython(
+            migrations.RunPython.noop, reviews.search.create_title_index
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='weighted_rating',
+            field=models.FloatField(editable=False, help_text='Рейтинг с поправкой на число отзывов', null=True, verbose_name='Взвешенный рейтинг'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['weighted_rating'], name='title_weighted_rating_idx'),
+        ),
+        migrations.RunPython(fill_weighted_rating, migrations.RunPython.noop),
+        # On SQLite AddField rebuilds reviews_title, dropping the triggers
+        # of the search index.
+        migrations.RunPython(
+            reviews.search.create_title_index, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0012_query_indexes'),
+    ]
+
+    operations = [
+        # title_name_year_idx starts with name and serves the same lookups.
+        migrations.RemoveIndex(
+            model_name='title',
+            name='title_name_idx',
+        ),
+    ]
@@ -1,8 +1,55 @@
-from django.db import models
+import threading
+from contextlib import contextmanager
 
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, models, transaction
+from django.db.models import (
+    Count,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, NullIf
+
+from . import search, versions
 from .validators import validator_year
 from users.models import User
 
+WEIGHTED_RATING = getattr(
+    settings, "WEIGHTED_RATING", {"MIN_REVIEWS": 10, "CACHE": "default"}
+)
+RATING_PRIOR_KEY = "rating_prior"
+
+_deleting = threading.local()
+
+
+@contextmanager
+def deleting(instance):
+    """Marks the instance as being deleted while its delete() cascades,
+    so signal receivers of its children can skip work for the parent."""
+    keys = _deleting.__dict__.setdefault("keys", set())
+    key = (type(instance), instance.pk)
+    keys.add(key)
+    try:
+        yield
+    finally:
+        keys.discard(key)
+
+
+def being_deleted(model, pk=None):
+    """Whether delete() of the model instance with pk (of any instance
+    if pk is None) is running in this thread."""
+    keys = getattr(_deleting, "keys", ())
+    if pk is None:
+        return any(key_model is model for key_model, _ in keys)
+    return (model, pk) in keys
+
 
 class CreatedModel(models.Model):
     """Abstract model. Adds the publication date on creation."""
@@ -67,6 +114,53 @@ class Category(models.Model):
         return self.slug
 
 
+class TitleQuerySet(models.QuerySet):
+    def search(self, query):
+        """Full-text search by name and description, best matches first;
+        a match in the name weighs more than one in the description.
+        Uses the FTS5 index where it exists, icontains lookups otherwise."""
+        words = search.query_words(query)
+        if not words:
+            return self.none()
+        if search.index_exists(connections[self.db]):
+            return (
+                self.filter(pk__in=search.matching_ids(words))
+                .annotate(search_rank=search.rank(words, Title._meta.db_table))
+                .order_by("search_rank", "id")
+            )
+        condition = Q()
+        for word in words:
+            condition &= Q(name__icontains=word) | Q(
+                description__icontains=word
+            )
+        return self.filter(condition)
+
+    def bulk_create_with_genres(self, titles, genre_ids):
+        """Insert titles and their genre links with two bulk inserts;
+        genre_ids holds a list of genre ids for each title.
+
+        Backends that cannot return ids from a bulk insert (SQLite) get
+        them from the newest rows: the transaction holds the write lock
+        from the first INSERT on, and ids only grow, so the last
+        len(titles) ids belong to the inserted titles in order."""
+        with transaction.atomic(using=self.db):
+            self.bulk_create(titles)
+            if titles and titles[0].pk is None:
+                ids = self.order_by("-pk").values_list("pk", flat=True)
+                for title, pk in zip(titles, list(ids[: len(titles)])[::-1]):
+                    title.pk = pk
+            through = Title.genre.through
+            through.objects.using(self.db).bulk_create(
+                [
+                    through(title_id=title.pk, genre_id=genre_id)
+                    for title, ids in zip(titles, genre_ids)
+                    for genre_id in ids
+                ]
+            )
+            versions.bump("title")
+        return titles
+
+
 class Title(models.Model):
     """Model Title."""
 
@@ -86,6 +180,24 @@ class Title(models.Model):
         blank=True,
         null=True,
     )
+    score_sum = models.PositiveIntegerField(
+        verbose_name="Сумма оценок",
+        help_text="Сумма оценок всех отзывов на произведение",
+        default=0,
+        editable=False,
+    )
+    review_count = models.PositiveIntegerField(
+        verbose_name="Количество отзывов",
+        help_text="Количество отзывов на произведение",
+        default=0,
+        editable=False,
+    )
+    weighted_rating = models.FloatField(
+        verbose_name="Взвешенный рейтинг",
+        help_text="Рейтинг с поправкой на число отзывов",
+        null=True,
+        editable=False,
+    )
     description = models.TextField(
         verbose_name="Описание",
         help_text="Краткое описание произведения",
@@ -107,14 +219,167 @@ class Title(models.Model):
         on_delete=models.SET_NULL,
     )
 
+    objects = TitleQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Произведение"
         verbose_name_plural = "Произведения"
         ordering = ["name", "year"]
+        indexes = [
+            models.Index(
+                fields=["weighted_rating"], name="title_weighted_rating_idx"
+            ),
+            models.Index(fields=["name", "year"], name="title_name_year_idx"),
+            models.Index(fields=["year"], name="title_year_idx"),
+            models.Index(fields=["rating"], name="title_rating_idx"),
+            models.Index(
+                fields=["review_count"], name="title_review_count_idx"
+            ),
+        ]
+
+    RATING_FIELDS = (
+        "rating",
+        "score_sum",
+        "review_count",
+        "weighted_rating",
+    )
 
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        with deleting(self):
+            return super().delete(*args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        """Never writes the rating counters back from a stale instance.
+        They are maintained only by change_score."""
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.RATING_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def rating_prior(cls, refresh=False):
+        """Mean score over all reviews, the prior of the weighted rating.
+        Kept in the WEIGHTED_RATING["CACHE"] cache until the next
+        recount_scores."""
+        cache = caches[WEIGHTED_RATING["CACHE"]]
+        prior = None if refresh else cache.get(RATING_PRIOR_KEY)
+        if prior is None:
+            totals = cls.objects.aggregate(
+                score_sum=Sum("score_sum"), review_count=Sum("review_count")
+            )
+            if not totals["review_count"]:
+                return 0.0
+            prior = totals["score_sum"] / totals["review_count"]
+            cache.set(RATING_PRIOR_KEY, prior, None)
+        return prior
+
+    @classmethod
+    def weighted_rating_expression(cls, score_sum, review_count):
+        """Bayesian weighted rating: the title's scores plus MIN_REVIEWS
+        imaginary reviews with the mean score of all titles, so a title
+        with a few reviews cannot outrank well-reviewed ones. NULL for
+        titles without reviews, like rating."""
+        weight = WEIGHTED_RATING["MIN_REVIEWS"]
+        return ExpressionWrapper(
+            (score_sum + Value(float(weight * cls.rating_prior())))
+            / (NullIf(review_count, 0) + weight),
+            output_field=FloatField(),
+        )
+
+    @classmethod
+    def change_score(cls, title_id, score_delta, count_delta=0):
+        """Atomically adjusts the score sum, review count, rating and
+        weighted rating of the title with a single UPDATE statement."""
+        score_sum = F("score_sum") + score_delta
+        review_count = F("review_count") + count_delta
+        cls.objects.filter(pk=title_id).update(
+            score_sum=score_sum,
+            review_count=review_count,
+            rating=score_sum / NullIf(review_count, 0),
+            weighted_rating=cls.weighted_rating_expression(
+                score_sum, review_count
+            ),
+        )
+
+    @classmethod
+    def recount_scores(cls, queryset=None):
+        """Recalculates the rating counters from the reviews table.
+        Needed after bulk inserts of reviews, which bypass Review.save."""
+        reviews = (
+            Review.objects.filter(title=OuterRef("pk"))
+            .order_by()
+            .values("title")
+        )
+        score_sum = Coalesce(
+            Subquery(reviews.annotate(total=Sum("score")).values("total")), 0
+        )
+        review_count = Coalesce(
+            Subquery(reviews.annotate(total=Count("id")).values("total")), 0
+        )
+        if queryset is None:
+            queryset = cls.objects.all()
+        queryset.update(
+            score_sum=score_sum,
+            review_count=review_count,
+            rating=score_sum / NullIf(review_count, 0),
+        )
+        cls.recount_weighted_ratings()
+
+    @classmethod
+    def recount_weighted_ratings(cls):
+        """Refreshes the rating prior and recalculates the weighted
+        rating of all titles with a single UPDATE. The prior drifts as
+        reviews are added, so this is also run periodically by the
+        recountratings command."""
+        cls.rating_prior(refresh=True)
+        cls.objects.update(
+            weighted_rating=cls.weighted_rating_expression(
+                F("score_sum"), F("review_count")
+            )
+        )
+
+    @classmethod
+    def score_stats(cls, title_id):
+        """Review count, mean and median score and a histogram of scores
+        1-10 of the title, from a single GROUP BY over its reviews."""
+        histogram = dict.fromkeys(range(1, 11), 0)
+        histogram.update(
+            Review.objects.filter(title_id=title_id)
+            .order_by()
+            .values_list("score")
+            .annotate(total=Count("id"))
+        )
+        count = sum(histogram.values())
+        if not count:
+            return {
+                "count": 0,
+                "mean": None,
+                "median": None,
+                "histogram": histogram,
+            }
+
+        def score_at(position):
+            for score, total in histogram.items():
+                if position < total:
+                    return score
+                position -= total
+
+        total = sum(score * number for score, number in histogram.items())
+        median = (score_at((count - 1) // 2) + score_at(count // 2)) / 2
+        return {
+            "count": count,
+            "mean": round(total / count, 2),
+            "median": median,
+            "histogram": histogram,
+        }
+
 
 class Review(CreatedModel):
     """Model Review for Title."""
@@ -149,10 +414,42 @@ class Review(CreatedModel):
         verbose_name_plural = "Отзывы"
         ordering = ["-pub_date"]
         unique_together = ["author", "title"]
+        indexes = [
+            models.Index(
+                fields=["title", "pub_date"], name="review_title_pub_date_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.text[:30]
 
+    def delete(self, *args, **kwargs):
+        with deleting(self):
+            return super().delete(*args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        """Saves the review and applies the score change to its title.
+        The stored score is re-read under a row lock, so concurrent
+        updates of one review apply their deltas one after another."""
+        update_fields = kwargs.get("update_fields")
+        adding = self._state.adding
+        scored = update_fields is None or "score" in update_fields
+        with transaction.atomic():
+            if not adding and scored:
+                old_score = (
+                    Review.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("score", flat=True)
+                    .first()
+                )
+                # A missing row is inserted by save().
+                adding = old_score is None
+            super().save(*args, **kwargs)
+            if adding:
+                Title.change_score(self.title_id, self.score, 1)
+            elif scored and self.score != old_score:
+                Title.change_score(self.title_id, self.score - old_score)
+
 
 class Comment(CreatedModel):
     """Model Comments for Review."""
@@ -180,6 +477,41 @@ class Comment(CreatedModel):
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(
+                fields=["review", "pub_date"],
+                name="comment_review_pub_date_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
+
+
+class ImportedRow(models.Model):
+    """Content hash of a CSV row loaded by the loaddata command.
+    Lets incremental loads skip rows that have not changed."""
+
+    table = models.CharField(
+        verbose_name="Таблица",
+        help_text="Имя файла, из которого загружена строка",
+        max_length=64,
+    )
+    row_id = models.CharField(
+        verbose_name="Идентификатор строки",
+        help_text="Значение столбца id строки",
+        max_length=64,
+    )
+    digest = models.CharField(
+        verbose_name="Хеш строки",
+        help_text="Хеш содержимого строки",
+        max_length=32,
+    )
+
+    class Meta:
+        verbose_name = "Загруженная строка"
+        verbose_name_plural = "Загруженные строки"
+        unique_together = ["table", "row_id"]
+
+    def __str__(self):
+        return f"{self.table}:{self.row_id}"
@@ -0,0 +1,156 @@
+"""Full-text search index over Title.name and Title.description.
+
+On SQLite with FTS5 the index is an external content FTS5 table kept in
+sync with reviews_title by triggers, so every way of writing titles
+(API, admin, bulk loaddata) updates it. Other backends have no index and
+Title.objects.search falls back to icontains lookups.
+"""
+import re
+import weakref
+
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "reviews_title_fts"
+TRIGGERS = tuple(
+    f"{FTS_TABLE}_{event}" for event in ("insert", "delete", "update")
+)
+# Whether a connection has the index, cached per DatabaseWrapper.
+_index_exists = weakref.WeakKeyDictionary()
+
+CREATE_SQL = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='reviews_title', content_rowid='id',
+        tokenize='unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON reviews_title BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON reviews_title BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, description ON reviews_title BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+DROP_SQL = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+
+def create_title_index(apps, schema_editor):
+    """Creates the index and its triggers and fills it from reviews_title.
+    Safe to run again, e.g. after a migration that rebuilt reviews_title
+    on SQLite and dropped its triggers."""
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    _index_exists.pop(connection, None)
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        if ("ENABLE_FTS5",) not in cursor.fetchall():
+            return
+        for sql in CREATE_SQL:
+            cursor.execute(sql)
+
+
+def drop_title_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    _index_exists.pop(connection, None)
+    with connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+def repair_title_index(connection):
+    """Recreates the triggers, and refills the index, if the index table
+    exists but a migration rebuilt reviews_title and dropped them.
+    Returns True if the index was repaired."""
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE name IN "
+            f"({', '.join(['%s'] * (len(TRIGGERS) + 1))})",
+            [FTS_TABLE, *TRIGGERS],
+        )
+        found = cursor.fetchall()
+        if ("table", FTS_TABLE) not in found or len(found) > len(TRIGGERS):
+            return False
+        for sql in CREATE_SQL:
+            cursor.execute(sql)
+    return True
+
+
+def index_exists(connection):
+    """Whether the connection has the index. Looked up once per
+    connection; migrations that create or drop it reset the result."""
+    if connection.vendor != "sqlite":
+        return False
+    if connection not in _index_exists:
+        _index_exists[connection] = (
+            FTS_TABLE in connection.introspection.table_names()
+        )
+    return _index_exists[connection]
+
+
+def query_words(query):
+    return re.findall(r"\w+", query)
+
+
+def match_expression(words):
+    """Builds an FTS5 query from words of user input. Every word is quoted,
+    so FTS5 syntax is never interpreted, and matched by prefix."""
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class RowidSubquery(RawSQL):
+    """RawSQL without the extra parentheses, for the right-hand side of
+    an __in lookup: SQLite reads "IN ((SELECT ...))" as a scalar
+    subquery that yields only the first row."""
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def matching_ids(words):
+    """Subquery of ids of titles that match the words."""
+    return RowidSubquery(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+        [match_expression(words)],
+    )
+
+
+def rank(words, table):
+    """bm25 rank of a row of table (lower is better); a match in the
+    name weighs more than one in the description."""
+    return RawSQL(
+        f"SELECT bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+        [match_expression(words)],
+        output_field=FloatField(),
+    )
@@ -0,0 +1,101 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+)
+from django.dispatch import receiver
+
+from . import search, versions
+from .models import Category, Comment, Genre, Review, Title, being_deleted
+from users.models import User
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Removes the score of a deleted review from its title.
+    Also covers cascade deletion of reviews together with their author.
+    Reviews deleted together with their title need no update."""
+    if not being_deleted(Title, instance.title_id):
+        Title.change_score(instance.title_id, -instance.score, -1)
+
+
+@receiver(post_save, sender=Title)
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_changed(sender, **kwargs):
+    versions.bump("title")
+
+
+@receiver(post_delete, sender=Title)
+def title_deleted(sender, instance, **kwargs):
+    """Reviews of a deleted title are gone even if it had none."""
+    versions.bump("title", versions.reviews(instance.pk))
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def genre_changed(sender, **kwargs):
+    """Titles embed their genres, so their version changes too."""
+    versions.bump("genre", "title")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    """Titles embed their category, so their version changes too."""
+    versions.bump("category", "title")
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    """Reviews and comments of a title share a version. Titles show
+    the rating, so their version changes too."""
+    versions.bump(versions.reviews(instance.title_id), "title")
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    """A comment deleted together with its review or title is covered
+    by the stamps that the review and title receivers bump."""
+    if being_deleted(Review, instance.review_id) or being_deleted(Title):
+        return
+    if Comment.review.is_cached(instance):
+        title_id = instance.review.title_id
+    else:
+        title_id = (
+            Review.objects.filter(pk=instance.review_id)
+            .values_list("title_id", flat=True)
+            .first()
+        )
+    if title_id is not None:
+        versions.bump(versions.reviews(title_id))
+
+
+@receiver(post_save, sender=User)
+def author_renamed(sender, instance, created, **kwargs):
+    """Reviews and comments show the username of their author."""
+    if created or not getattr(instance, "renamed", False):
+        return
+    title_ids = set(
+        Review.objects.filter(author=instance).values_list(
+            "title_id", flat=True
+        )
+    )
+    title_ids.update(
+        Comment.objects.filter(author=instance).values_list(
+            "review__title_id", flat=True
+        )
+    )
+    if title_ids:
+        versions.bump(*map(versions.reviews, title_ids))
+
+
+@receiver(post_migrate)
+def title_index_repaired(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Migrations that rebuild reviews_title on SQLite drop the triggers
+    of the search index, so they are checked after every migrate."""
+    if sender.label == "reviews":
+        search.repair_title_index(connections[using])
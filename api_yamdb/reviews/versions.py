@@ -0,0 +1,84 @@
+"""Version stamps of the catalog data for conditional GET requests.
+
+Each name ("title", "genre", "category", "review:<title_id>") maps to an
+integer stamp in the shared cache: the time of the last write in
+microseconds, moved forward by at least one on every bump. A stamp
+serves both as a version for ETag and as a Last-Modified time. The "all"
+stamp is part of every lookup and is bumped by bulk loads that bypass
+model signals.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_CACHE = getattr(settings, "VERSION_CACHE", "default")
+KEY_PREFIX = "version:"
+ALL = "all"
+
+
+def now():
+    return time.time_ns() // 1000
+
+
+def reviews(title_id):
+    """Name of the stamp of the reviews and comments of a title. The id
+    may come from a URL kwarg ("03"), so it is normalised to an int."""
+    return f"review:{int(title_id)}"
+
+
+def get_versions(*names):
+    """Stamps of the names plus the "all" stamp, in the given order.
+    A missing stamp (new name or evicted key) starts at the current time,
+    so it never looks older than the data already served."""
+    cache = caches[VERSION_CACHE]
+    names = (ALL,) + names
+    keys = [KEY_PREFIX + name for name in names]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            stamp = now()
+            if not cache.add(key, stamp, timeout=None):
+                stamp = cache.get(key, stamp)
+            stamps[key] = stamp
+    return [stamps[key] for key in keys]
+
+
+def bump(*names):
+    """Moves the stamps forward once the current transaction commits,
+    so a reader never gets a new stamp together with old data. Names
+    bumped in one transaction are written together by one callback."""
+    connection = transaction.get_connection()
+    pending = getattr(connection, "pending_versions", None)
+    if pending is not None and any(
+        func is pending for _, func in connection.run_on_commit
+    ):
+        pending.names.update(names)
+        return
+    # No callback yet, or it is gone after a commit or rollback. Outside
+    # of a transaction on_commit runs the callback right away.
+    pending = connection.pending_versions = PendingVersions(names)
+    transaction.on_commit(pending)
+
+
+class PendingVersions:
+    """on_commit callback writing the stamps bumped in a transaction."""
+
+    def __init__(self, names):
+        self.names = set(names)
+
+    def __call__(self):
+        cache = caches[VERSION_CACHE]
+        keys = [KEY_PREFIX + name for name in self.names]
+        stamps = cache.get_many(keys)
+        stamp = now()
+        cache.set_many(
+            {key: max(stamp, stamps.get(key, 0) + 1) for key in keys},
+            timeout=None,
+        )
+
+
+def bump_all():
+    """Invalidates every stamp, e.g. after a bulk load."""
+    bump(ALL)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import User
+from .models import OutgoingEmail, User
 
 
 class CustomUserAdmin(UserAdmin):
@@ -49,4 +49,13 @@ class CustomUserAdmin(UserAdmin):
     ordering = ("role", "username")
 
 
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    """Очередь исходящих писем."""
+
+    list_display = ("recipient", "subject", "created", "attempts", "sent_at")
+    list_filter = ("sent_at",)
+    search_fields = ("recipient",)
+
+
 admin.site.register(User, CustomUserAdmin)
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
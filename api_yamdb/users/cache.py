@@ -0,0 +1,97 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+USER_CACHE = getattr(settings, "USER_CACHE", {})
+
+
+class UserCache:
+    """Кеш пользователей по id для аутентификации запросов.
+
+    Первый уровень - ограниченный LRU в памяти процесса, второй -
+    необязательный общий кеш Django (SHARED_CACHE - алиас из CACHES).
+    Записи первого уровня живут не дольше TIMEOUT секунд: изменения,
+    сделанные в других процессах, сбрасывают только общий кеш. При
+    max_size=0 первого уровня нет и все процессы видят одни значения.
+    Значения хранятся сериализованными, каждый запрос получает
+    свой экземпляр."""
+
+    def __init__(
+        self, max_size=1024, timeout=60, shared_cache=None, key_prefix="user:"
+    ):
+        self.key_prefix = key_prefix
+        self.max_size = max_size
+        self.timeout = timeout
+        self.shared_cache = shared_cache
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def shared(self):
+        if self.shared_cache is None:
+            return None
+        return caches[self.shared_cache]
+
+    def get(self, user_id):
+        key = self.key_prefix + str(user_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                return pickle.loads(entry[1])
+        if self.shared is not None:
+            data = self.shared.get(key)
+            if data is not None:
+                self.store(key, data)
+                return pickle.loads(data)
+        return None
+
+    def set(self, user_id, user):
+        key = self.key_prefix + str(user_id)
+        data = pickle.dumps(user)
+        self.store(key, data)
+        if self.shared is not None:
+            self.shared.set(key, data, self.timeout)
+
+    def store(self, key, data):
+        if not self.max_size:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Сбрасывает запись сразу и еще раз после фиксации транзакции,
+        чтобы параллельный запрос не закешировал старую версию строки."""
+        self.discard(user_id)
+        transaction.on_commit(lambda: self.discard(user_id))
+
+    def discard(self, user_id):
+        key = self.key_prefix + str(user_id)
+        with self.lock:
+            self.entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+
+user_cache = UserCache(
+    max_size=USER_CACHE.get("MAX_SIZE", 1024),
+    timeout=USER_CACHE.get("TIMEOUT", 60),
+    shared_cache=USER_CACHE.get("SHARED_CACHE"),
+)
+
+# Отзыв токенов должен действовать сразу во всех процессах, поэтому
+# версии токенов хранятся только в общем кеше.
+token_version_cache = UserCache(
+    max_size=0,
+    timeout=USER_CACHE.get("TIMEOUT", 60),
+    shared_cache=USER_CACHE.get("TOKEN_VERSION_CACHE", "shared"),
+    key_prefix="token_version:",
+)
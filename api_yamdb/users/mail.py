@@ -0,0 +1,160 @@
+import hashlib
+import os
+import re
+import threading
+from email import message_from_bytes, policy
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MESSAGES = getattr(settings, "MESSAGES", None)
+INDEX_NAME = "index.tsv"
+MAILBOX_NAME = "mailbox-{:04d}.eml"
+
+
+def shard_path(root, day, address):
+    """Каталог для писем на адрес за день: <root>/<YYYY-MM-DD>/<xx>/."""
+    digest = hashlib.md5(address.lower().encode("utf-8")).hexdigest()
+    return os.path.join(root, day, digest[:2])
+
+
+class ShardedFileEmailBackend(BaseEmailBackend):
+    """Сохраняет письма в файлы вместо отправки.
+
+    Письма раскладываются по каталогам дня и хеша адреса получателя и
+    дописываются в файлы mailbox-NNNN.eml. Когда файл достигает
+    EMAIL_FILE_MAX_SIZE байт, начинается следующий. В index.tsv каталога
+    для каждого письма записываются адрес, время, файл, смещение и длина,
+    что позволяет быстро найти последнее письмо на адрес (last_message)."""
+
+    def __init__(self, file_path=None, max_size=None, **kwargs):
+        super().__init__(**kwargs)
+        self.file_path = os.path.abspath(
+            file_path or getattr(settings, "EMAIL_FILE_PATH")
+        )
+        self.max_size = max_size or getattr(
+            settings, "EMAIL_FILE_MAX_SIZE", 10 * 1024 * 1024
+        )
+        self._lock = threading.RLock()
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        sent = 0
+        with self._lock:
+            for message in email_messages:
+                try:
+                    data = message.message().as_bytes(linesep="\n")
+                    for address in message.recipients():
+                        self.write(address, data)
+                except Exception:
+                    if not self.fail_silently:
+                        raise
+                else:
+                    sent += 1
+        return sent
+
+    def write(self, address, data):
+        now = timezone.now()
+        shard = shard_path(self.file_path, now.strftime("%Y-%m-%d"), address)
+        os.makedirs(shard, exist_ok=True)
+        with open(os.path.join(shard, INDEX_NAME), "a") as index:
+            if fcntl is not None:
+                fcntl.flock(index, fcntl.LOCK_EX)
+            name = self.current_mailbox(shard, len(data))
+            with open(os.path.join(shard, name), "ab") as mailbox:
+                offset = mailbox.tell()
+                mailbox.write(data + b"\n")
+            index.write(
+                f"{address.lower()}\t{now.isoformat()}\t{name}\t"
+                f"{offset}\t{len(data)}\n"
+            )
+
+    def current_mailbox(self, shard, size):
+        """Последний файл каталога или следующий, если письмо в него
+        уже не помещается."""
+        numbers = [
+            int(name[8:12])
+            for name in os.listdir(shard)
+            if re.fullmatch(r"mailbox-\d{4}\.eml", name)
+        ]
+        number = max(numbers, default=0)
+        path = os.path.join(shard, MAILBOX_NAME.format(number))
+        if os.path.exists(path) and os.path.getsize(path) + size > (
+            self.max_size
+        ):
+            number += 1
+        return MAILBOX_NAME.format(number)
+
+
+def reversed_lines(path, block_size=8192):
+    """Строки файла с конца, без чтения всего файла в память."""
+    with open(path, "rb") as file:
+        position = file.seek(0, os.SEEK_END)
+        tail = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            file.seek(position)
+            lines = (file.read(size) + tail).split(b"\n")
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line.decode("utf-8")
+        if tail:
+            yield tail.decode("utf-8")
+
+
+def last_message(address, file_path=None, since=None):
+    """Последнее письмо на адрес (email.message.EmailMessage) или None.
+    Просматривает только индексы каталогов с хешем адреса, начиная
+    с последнего дня и с конца индекса. since ограничивает поиск днями
+    не раньше указанного времени."""
+    root = os.path.abspath(file_path or getattr(settings, "EMAIL_FILE_PATH"))
+    if not os.path.isdir(root):
+        return None
+    address = address.lower()
+    first_day = since.strftime("%Y-%m-%d") if since else ""
+    days = [
+        day
+        for day in os.listdir(root)
+        if re.fullmatch(r"\d{4}-\d{2}-\d{2}", day) and day >= first_day
+    ]
+    for day in sorted(days, reverse=True):
+        shard = shard_path(root, day, address)
+        index_path = os.path.join(shard, INDEX_NAME)
+        if not os.path.exists(index_path):
+            continue
+        for line in reversed_lines(index_path):
+            recipient, _, name, offset, length = line.split("\t")
+            if recipient == address:
+                with open(os.path.join(shard, name), "rb") as mailbox:
+                    mailbox.seek(int(offset))
+                    return message_from_bytes(
+                        mailbox.read(int(length)), policy=policy.default
+                    )
+    return None
+
+
+def last_confirmation_code(address, file_path=None):
+    """Код подтверждения из последнего письма на адрес или None.
+    Письма старше срока действия кода не просматриваются."""
+    message = last_message(
+        address,
+        file_path,
+        since=timezone.now() - settings.CONFIRMATION_CODE_TTL,
+    )
+    if message is None:
+        return None
+    body = message.get_body(("plain",))
+    if body is None:
+        return None
+    pattern = re.escape(MESSAGES["mail_text"]).replace(r"\{\}", r"(\S+)")
+    match = re.search(pattern, body.get_content())
+    return match.group(1) if match else None
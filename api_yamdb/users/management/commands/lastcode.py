@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.mail import last_confirmation_code
+
+
+class Command(BaseCommand):
+    help = (
+        "Выводит код подтверждения из последнего письма на адрес, "
+        "сохраненного ShardedFileEmailBackend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="Адрес получателя.")
+
+    def handle(self, *args, **options):
+        code = last_confirmation_code(options["email"])
+        if code is None:
+            raise CommandError(f"No confirmation code for {options['email']}")
+        self.stdout.write(code)
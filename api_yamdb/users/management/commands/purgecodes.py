@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import ConfirmationCode, OutgoingEmail
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет просроченные коды подтверждения и письма старше срока "
+        "действия кода."
+    )
+
+    def handle(self, *args, **options):
+        deleted, _ = ConfirmationCode.objects.expired().delete()
+        emails, _ = OutgoingEmail.objects.filter(
+            created__lte=timezone.now() - settings.CONFIRMATION_CODE_TTL
+        ).delete()
+        self.stdout.write(f"deleted: {deleted}, emails: {emails}")
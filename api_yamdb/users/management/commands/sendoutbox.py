@@ -0,0 +1,154 @@
+import time
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import OutgoingEmail
+
+
+class Command(BaseCommand):
+    help = (
+        "Отправляет письма из очереди OutgoingEmail пачками через одно "
+        "соединение с почтовым сервером. Неудачные отправки повторяются "
+        "с экспоненциальной задержкой."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Количество писем, отправляемых за одно соединение.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Количество попыток, после которого письмо не отправляется.",
+        )
+        parser.add_argument(
+            "--retry-delay",
+            type=int,
+            default=60,
+            help="Задержка перед первой повторной попыткой в секундах, "
+            "каждая следующая вдвое больше.",
+        )
+        parser.add_argument(
+            "--lease",
+            type=int,
+            default=300,
+            help="На сколько секунд письма пачки занимаются обработчиком, "
+            "пока идет их отправка.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Не завершаться на пустой очереди, а проверять ее "
+            "каждые --interval секунд.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Пауза между проверками очереди в режиме --loop.",
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Только вывести размер очереди.",
+        )
+
+    def handle(self, *args, **options):
+        self.max_attempts = options["max_attempts"]
+        self.retry_delay = options["retry_delay"]
+        self.lease = options["lease"]
+        if options["stats"]:
+            self.print_stats()
+            return
+        while True:
+            while self.send_batch(options["batch_size"]):
+                pass
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.print_stats()
+
+    def print_stats(self):
+        pending = OutgoingEmail.objects.filter(sent_at__isnull=True)
+        failed = OutgoingEmail.objects.failed(self.max_attempts).count()
+        self.stdout.write(
+            f"queued: {pending.count() - failed}, failed: {failed}"
+        )
+
+    def send_batch(self, batch_size):
+        """Отправляет одну пачку писем. Возвращает количество писем,
+        которые пытались отправить.
+        Письма отправляются вне транзакции: строки сначала занимаются
+        на время --lease, а результаты записываются отдельной транзакцией."""
+        emails = self.claim(batch_size)
+        if not emails:
+            return 0
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as error:
+            for email in emails:
+                self.mark_failed(email, error)
+        else:
+            for email in emails:
+                self.send(email, connection)
+            connection.close()
+        with transaction.atomic():
+            OutgoingEmail.objects.bulk_update(
+                emails, ["body", "last_error", "send_after", "sent_at"]
+            )
+        sent = sum(email.sent_at is not None for email in emails)
+        self.stdout.write(f"sent: {sent}, failed: {len(emails) - sent}")
+        return len(emails)
+
+    def claim(self, batch_size):
+        """Занимает пачку писем: попытка засчитывается сразу, следующая
+        назначается через --lease секунд. Если процесс прервется во время
+        отправки, письма возьмет другой обработчик после истечения аренды."""
+        with transaction.atomic():
+            emails = list(
+                OutgoingEmail.objects.pending(self.max_attempts)
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+            send_after = timezone.now() + timedelta(seconds=self.lease)
+            for email in emails:
+                email.attempts += 1
+                email.send_after = send_after
+            OutgoingEmail.objects.bulk_update(
+                emails, ["attempts", "send_after"]
+            )
+        return emails
+
+    def send(self, email, connection):
+        message = EmailMessage(
+            email.subject,
+            email.body,
+            email.from_email,
+            [email.recipient],
+            connection=connection,
+        )
+        try:
+            message.send()
+        except Exception as error:
+            self.mark_failed(email, error)
+        else:
+            email.sent_at = timezone.now()
+            # В тексте письма код подтверждения, в БД он хранится
+            # только в виде хеша.
+            email.body = ""
+
+    def mark_failed(self, email, error):
+        """Откладывает следующую попытку: задержка удваивается
+        с каждой неудачей."""
+        email.last_error = str(error)
+        email.send_after = timezone.now() + timedelta(
+            seconds=self.retry_delay * 2 ** (email.attempts - 1)
+        )
@@ -1,6 +1,13 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser, Permission
 from django.core.management.utils import get_random_secret_key
 from django.db import models
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+ADMIN_PERMISSIONS = ("add_user", "change_user")
 
 
 class User(AbstractUser):
@@ -12,8 +19,10 @@ class User(AbstractUser):
         (MODERATOR, "Модератор"),
         (ADMIN, "Администратор"),
     )
+    _admin_permission_ids = None
 
     def get_secret_key():
+        # Используется в миграции 0003.
         return get_random_secret_key()
 
     email = models.EmailField(
@@ -36,14 +45,21 @@ class User(AbstractUser):
         null=True,
         default=None,
     )
-    confirmation_code = models.CharField(
-        "Код подтверждения", max_length=64, default=get_secret_key
+    token_version = models.PositiveIntegerField(
+        "Версия токенов",
+        default=0,
+        editable=False,
     )
 
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
         ordering = ["role", "username"]
+        indexes = [
+            models.Index(
+                fields=["role", "username"], name="user_role_username_idx"
+            ),
+        ]
 
     @property
     def is_admin(self):
@@ -57,16 +73,164 @@ class User(AbstractUser):
     def is_user(self):
         return self.role == self.USER
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_access = instance.access_claims()
+        return instance
+
+    def access_claims(self):
+        """Поля пользователя, которые передаются в токене доступа."""
+        return (
+            self.__dict__.get("username"),
+            self.__dict__.get("role"),
+            self.__dict__.get("is_superuser"),
+        )
+
+    @classmethod
+    def admin_permission_ids(cls):
+        """Идентификаторы прав администратора. Кешируются в процессе,
+        кеш сбрасывается после миграций (сигнал post_migrate)."""
+        if not cls._admin_permission_ids:
+            cls._admin_permission_ids = list(
+                Permission.objects.filter(
+                    codename__in=ADMIN_PERMISSIONS
+                ).values_list("id", flat=True)
+            )
+        return cls._admin_permission_ids
+
+    @classmethod
+    def grant_admin_permissions(cls, user_ids):
+        """Выдает права администратора пользователям одним INSERT
+        в промежуточную таблицу."""
+        permission_ids = cls.admin_permission_ids()
+        through = cls.user_permissions.through
+        through.objects.bulk_create(
+            [
+                through(user_id=user_id, permission_id=permission_id)
+                for user_id in user_ids
+                for permission_id in permission_ids
+            ],
+            ignore_conflicts=True,
+        )
+
     def save(self, *args, **kwargs):
         if self.role == self.ADMIN:
             self.is_staff = True
+        loaded_access = getattr(self, "_loaded_access", None)
+        # Имя показывается в отзывах и комментариях пользователя.
+        self.renamed = bool(loaded_access) and (
+            loaded_access[0] != self.access_claims()[0]
+        )
+        if loaded_access and loaded_access != self.access_claims():
+            # Выданные ранее токены содержат старые имя или роль.
+            self.token_version += 1
+        self._loaded_access = self.access_claims()
         super(User, self).save(*args, **kwargs)
         if self.role == self.ADMIN:
-            save_user = User.objects.get(username=self.username)
-            needet_permission = ("add_user", "change_user")
-            for permission_code in needet_permission:
-                permission = Permission.objects.get(codename=permission_code)
-                save_user.user_permissions.add(permission)
+            self.grant_admin_permissions([self.pk])
 
     def __str__(self):
         return self.username
+
+
+class OutgoingEmailQuerySet(models.QuerySet):
+    def pending(self, max_attempts):
+        """Письма, которые пора отправить."""
+        return self.filter(
+            sent_at__isnull=True,
+            attempts__lt=max_attempts,
+            send_after__lte=timezone.now(),
+        )
+
+    def failed(self, max_attempts):
+        """Письма, которые не удалось отправить за max_attempts попыток."""
+        return self.filter(sent_at__isnull=True, attempts__gte=max_attempts)
+
+
+class OutgoingEmail(models.Model):
+    """Очередь исходящих писем. Запись создается в транзакции запроса,
+    письмо отправляет команда sendoutbox."""
+
+    recipient = models.EmailField("Получатель", max_length=254)
+    subject = models.CharField("Тема", max_length=256)
+    body = models.TextField("Текст")
+    from_email = models.EmailField("Отправитель", max_length=254)
+    created = models.DateTimeField("Создано", auto_now_add=True)
+    send_after = models.DateTimeField("Отправить после", default=timezone.now)
+    attempts = models.PositiveSmallIntegerField("Попыток отправки", default=0)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    sent_at = models.DateTimeField("Отправлено", null=True, blank=True)
+
+    objects = OutgoingEmailQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Исходящее письмо"
+        verbose_name_plural = "Исходящие письма"
+        ordering = ["send_after", "id"]
+        indexes = [
+            models.Index(
+                fields=["sent_at", "send_after"],
+                name="outgoing_email_queue_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient}: {self.subject}"
+
+
+class ConfirmationCodeQuerySet(models.QuerySet):
+    @staticmethod
+    def hash(code):
+        return hashlib.sha256(str(code).encode("utf-8")).hexdigest()
+
+    def issue(self, user):
+        """Создает код подтверждения для пользователя и возвращает его.
+        В БД хранится только хеш кода."""
+        code = get_random_string(settings.CONFIRMATION_CODE_LENGTH)
+        self.create(
+            user=user,
+            code_hash=self.hash(code),
+            expires_at=timezone.now() + settings.CONFIRMATION_CODE_TTL,
+        )
+        return code
+
+    def consume(self, user, code):
+        """Проверяет и удаляет действующий код одним запросом DELETE.
+        Возвращает True, если код был действителен."""
+        deleted, _ = self.filter(
+            user=user,
+            code_hash=self.hash(code),
+            expires_at__gt=timezone.now(),
+        ).delete()
+        return deleted > 0
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+
+class ConfirmationCode(models.Model):
+    """Одноразовый код подтверждения для получения токена."""
+
+    user = models.ForeignKey(
+        User,
+        verbose_name="Пользователь",
+        related_name="confirmation_codes",
+        on_delete=models.CASCADE,
+    )
+    code_hash = models.CharField("Хеш кода", max_length=64)
+    expires_at = models.DateTimeField("Действует до", db_index=True)
+
+    objects = ConfirmationCodeQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Код подтверждения"
+        verbose_name_plural = "Коды подтверждения"
+        indexes = [
+            models.Index(
+                fields=["user", "code_hash"], name="confirmation_code_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.expires_at}"
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .cache import token_version_cache, user_cache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Сбрасывает пользователя и версию его токенов в кеше
+    аутентификации."""
+    user_cache.invalidate(instance.pk)
+    token_version_cache.invalidate(instance.pk)
+
+
+@receiver(post_migrate)
+def permissions_changed(sender, **kwargs):
+    """После миграций права могли быть созданы заново с другими id."""
+    User._admin_permission_ids = None
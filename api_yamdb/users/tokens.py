@@ -0,0 +1,38 @@
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User
+
+
+class RoleAccessToken(AccessToken):
+    """Токен доступа с именем, ролью пользователя и версией токенов.
+    Позволяет проверять права без загрузки пользователя из БД."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["username"] = user.username
+        token["role"] = user.role
+        token["is_superuser"] = user.is_superuser
+        token["token_version"] = user.token_version
+        return token
+
+
+class RoleTokenUser(TokenUser):
+    """Пользователь, восстановленный из RoleAccessToken без запроса к БД."""
+
+    @property
+    def role(self):
+        return self.token["role"]
+
+    @property
+    def is_admin(self):
+        return self.role == User.ADMIN
+
+    @property
+    def is_moderator(self):
+        return self.role == User.MODERATOR
+
+    @property
+    def is_user(self):
+        return self.role == User.USER
@@ -0,0 +1,11 @@
+import pytest
+from django.core.cache import caches
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(django_db_setup, django_db_blocker):
+    # Кеш в БД не очищается вместе с таблицами моделей, а счетчики
+    # ограничения запросов не должны переходить из теста в тест.
+    with django_db_blocker.unblock():
+        for cache in caches.all():
+            cache.clear()
@@ -0,0 +1,63 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.pagination import PageNumberPagination
+
+from reviews.models import Category, Genre, Title
+
+
+class Test08TitleQueries:
+
+    @staticmethod
+    def create_catalog(size):
+        Category.objects.bulk_create(
+            Category(name=f'Категория {i}', slug=f'category-{i}') for i in range(3)
+        )
+        Genre.objects.bulk_create(
+            Genre(name=f'Жанр {i}', slug=f'genre-{i}') for i in range(4)
+        )
+        categories = list(Category.objects.order_by('slug'))
+        genres = list(Genre.objects.order_by('slug'))
+        Title.objects.bulk_create(
+            Title(name=f'Произведение {i:04}', year=2000, category=categories[i % 3])
+            for i in range(size)
+        )
+        through = Title.genre.through
+        through.objects.bulk_create(
+            through(title_id=title_id, genre_id=genre.id)
+            for title_id in Title.objects.values_list('id', flat=True)
+            for genre in genres[:2]
+        )
+
+    @staticmethod
+    def count_queries(client, monkeypatch, page_size):
+        monkeypatch.setattr(PageNumberPagination, 'page_size', page_size)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get('/api/v1/titles/')
+        assert response.status_code == 200
+        assert len(response.json()['results']) == page_size
+        return len(context)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_title_list_constant_queries(self, client, monkeypatch):
+        self.create_catalog(500)
+        client.get('/api/v1/titles/')
+        small_page = self.count_queries(client, monkeypatch, 5)
+        large_page = self.count_queries(client, monkeypatch, 500)
+        assert small_page == large_page, (
+            'Проверьте, что количество запросов к БД при GET запросе `/api/v1/titles/` '
+            'не зависит от размера страницы'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_title_detail_nested_data(self, client):
+        self.create_catalog(1)
+        title = Title.objects.get()
+        response = client.get(f'/api/v1/titles/{title.id}/')
+        data = response.json()
+        assert data['category'] == {'name': 'Категория 0', 'slug': 'category-0'}, (
+            'Проверьте, что при GET запросе `/api/v1/titles/{title_id}/` возвращается категория'
+        )
+        assert len(data['genre']) == 2, (
+            'Проверьте, что при GET запросе `/api/v1/titles/{title_id}/` возвращаются жанры'
+        )
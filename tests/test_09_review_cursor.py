@@ -0,0 +1,40 @@
+import pytest
+
+from reviews.models import Review, Title
+
+
+class Test09ReviewCursorAPI:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_reviews_cursor_pages(self, client, django_user_model):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        for i in range(7):
+            author = django_user_model.objects.create_user(
+                username=f'author{i}', email=f'author{i}@yamdb.fake'
+            )
+            Review.objects.create(title=title, author=author, text=f'text{i}', score=5)
+        url = f'/api/v1/titles/{title.id}/reviews/'
+
+        response = client.get(url)
+        assert 'count' in response.json(), (
+            'Проверьте, что по умолчанию `/api/v1/titles/{title_id}/reviews/` '
+            'использует пагинацию по номеру страницы'
+        )
+
+        response = client.get(url, {'pagination': 'cursor'})
+        assert response.status_code == 200
+        data = response.json()
+        assert 'count' not in data and data['next'], (
+            'Проверьте, что при GET запросе `/api/v1/titles/{title_id}/reviews/?pagination=cursor` '
+            'возвращается ссылка на следующую страницу по курсору без `count`'
+        )
+        ids = [review['id'] for review in data['results']]
+        data = client.get(data['next']).json()
+        ids += [review['id'] for review in data['results']]
+        assert data['next'] is None
+        expected = list(
+            Review.objects.filter(title=title).order_by('-pub_date', '-id').values_list('id', flat=True)
+        )
+        assert ids == expected, (
+            'Проверьте, что пагинация по курсору возвращает отзывы от новых к старым без пропусков'
+        )
@@ -0,0 +1,62 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from reviews.models import Title
+
+
+class Test10TitleSearchAPI:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_title_search(self, client, admin_client):
+        Title.objects.create(name='Побег из Шоушенка', year=1994, description='Тюремная драма')
+        Title.objects.create(name='Крестный отец', year=1972, description='Побег от семьи')
+        Title.objects.create(name='Зеленая миля', year=1999)
+
+        response = client.get('/api/v1/titles/', {'search': 'побег'})
+        assert response.status_code == 200, (
+            'Проверьте, что при GET запросе `/api/v1/titles/?search=` возвращается статус 200'
+        )
+        names = [title['name'] for title in response.json()['results']]
+        assert sorted(names) == ['Крестный отец', 'Побег из Шоушенка'], (
+            'Проверьте, что `/api/v1/titles/?search=` ищет по названию и описанию без учета регистра'
+        )
+
+        title = Title.objects.get(name='Зеленая миля')
+        response = admin_client.patch(f'/api/v1/titles/{title.id}/', data={'name': 'Зеленый побег'})
+        assert response.status_code == 200
+        response = client.get('/api/v1/titles/', {'search': 'зелен'})
+        names = [title['name'] for title in response.json()['results']]
+        assert names == ['Зеленый побег'], (
+            'Проверьте, что поиск учитывает изменение произведения и ищет по началу слова'
+        )
+
+        admin_client.delete(f'/api/v1/titles/{title.id}/')
+        response = client.get('/api/v1/titles/', {'search': '"зеленый'})
+        assert response.json()['count'] == 0, (
+            'Проверьте, что удаленные произведения не находятся поиском'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_index_triggers_after_migrate(self, client):
+        triggers = {'reviews_title_fts_insert', 'reviews_title_fts_delete', 'reviews_title_fts_update'}
+
+        def existing_triggers():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+                return {name for name, in cursor.fetchall()} & triggers
+
+        assert existing_triggers() == triggers, (
+            'Проверьте, что после миграций у индекса поиска есть триггеры синхронизации'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER reviews_title_fts_insert')
+        Title.objects.create(name='Побег из Шоушенка', year=1994)
+        call_command('migrate', verbosity=0)
+        assert existing_triggers() == triggers, (
+            'Проверьте, что migrate восстанавливает удаленные триггеры индекса поиска'
+        )
+        response = client.get('/api/v1/titles/', {'search': 'побег'})
+        assert response.json()['count'] == 1, (
+            'Проверьте, что после восстановления триггеров индекс поиска заполняется заново'
+        )
@@ -0,0 +1,40 @@
+import pytest
+
+from .common import create_titles
+
+
+class Test11TitleFiltersAPI:
+
+    @staticmethod
+    def names(client, params):
+        response = client.get('/api/v1/titles/', params)
+        assert response.status_code == 200
+        return sorted(title['name'] for title in response.json()['results'])
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_genre_and_category_filters(self, client, admin_client):
+        create_titles(admin_client)
+        assert self.names(client, {'genre': 'horror,drama'}) == ['Поворот туда', 'Проект'], (
+            'Проверьте, что `?genre=` принимает несколько жанров через запятую'
+        )
+        assert self.names(client, {'genre': 'horror,comedy', 'genre_mode': 'all'}) == ['Поворот туда'], (
+            'Проверьте, что `?genre_mode=all` оставляет произведения со всеми жанрами'
+        )
+        assert self.names(client, {'genre': 'horror,drama', 'genre_mode': 'all'}) == [], (
+            'Проверьте, что `?genre_mode=all` оставляет произведения со всеми жанрами'
+        )
+        assert self.names(client, {'genre': 'horr'}) == [], (
+            'Проверьте, что `?genre=` ищет точное совпадение slug'
+        )
+        assert self.names(client, {'category': 'books,films'}) == ['Поворот туда', 'Проект'], (
+            'Проверьте, что `?category=` принимает несколько категорий через запятую'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_year_range(self, client, admin_client):
+        create_titles(admin_client)
+        assert self.names(client, {'year_min': 2001}) == ['Проект']
+        assert self.names(client, {'year_max': 2001}) == ['Поворот туда']
+        assert self.names(client, {'year_min': 2000, 'year_max': 2020}) == ['Поворот туда', 'Проект'], (
+            'Проверьте, что `?year_min=` и `?year_max=` задают диапазон лет включительно'
+        )
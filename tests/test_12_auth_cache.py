@@ -0,0 +1,37 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class Test12AuthCache:
+
+    @staticmethod
+    def count_queries(client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == 200
+        return len(context)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_cached_user_no_queries(self, client, user_client):
+        client.get('/api/v1/categories/')
+        anonymous = self.count_queries(client, '/api/v1/categories/')
+        self.count_queries(user_client, '/api/v1/categories/')
+        authenticated = self.count_queries(user_client, '/api/v1/categories/')
+        assert authenticated == anonymous, (
+            'Проверьте, что повторный запрос с токеном не обращается к БД за пользователем'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_cache_invalidated_on_change(self, admin_client, user_client, user):
+        data = {'name': 'Фильм', 'slug': 'films'}
+        assert user_client.post('/api/v1/categories/', data=data).status_code == 403
+        user.role = 'admin'
+        user.save()
+        assert user_client.post('/api/v1/categories/', data=data).status_code == 201, (
+            'Проверьте, что изменение пользователя сбрасывает его в кеше аутентификации'
+        )
+        admin_client.delete(f'/api/v1/users/{user.username}/')
+        assert user_client.get('/api/v1/categories/').status_code == 401, (
+            'Проверьте, что удаленный пользователь не проходит аутентификацию'
+        )
@@ -0,0 +1,116 @@
+import pytest
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from reviews.models import Title
+from users.cache import UserCache, token_version_cache
+from users.models import ConfirmationCode, User
+from users.tokens import RoleAccessToken
+
+
+def role_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleAccessToken.for_user(user)}')
+    return client
+
+
+class Test13RoleTokens:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_token_claims(self, client, user):
+        response = client.post(
+            '/api/v1/auth/token/',
+            data={'username': user.username, 'confirmation_code': ConfirmationCode.objects.issue(user)}
+        )
+        assert response.status_code == 200
+        token = RoleAccessToken(response.json()['access'])
+        assert token['username'] == user.username and token['role'] == 'user', (
+            'Проверьте, что токен доступа содержит имя и роль пользователя'
+        )
+        assert token['token_version'] == user.token_version
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_permissions_from_claims(self, client, admin, user):
+        admin_client = role_client(admin)
+        user_client = role_client(user)
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        admin_client.get('/api/v1/categories/')
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.post('/api/v1/categories/', data={'name': 'Фильм', 'slug': 'films'})
+        assert response.status_code == 201
+        assert not any('users_user' in query['sql'] for query in context.captured_queries), (
+            'Проверьте, что права администратора проверяются по токену без загрузки пользователя'
+        )
+        assert user_client.post('/api/v1/categories/', data={'name': 'Книги', 'slug': 'books'}).status_code == 403
+
+        url = f'/api/v1/titles/{title.id}/reviews/'
+        response = user_client.post(url, data={'text': 'Текст', 'score': 7})
+        assert response.status_code == 201
+        assert response.json()['author'] == user.username
+        review_url = f'{url}{response.json()["id"]}/'
+        assert user_client.patch(review_url, data={'score': 8}).status_code == 200, (
+            'Проверьте, что автор может изменить свой отзыв с токеном RoleAccessToken'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_role_change_revokes_tokens(self, admin, user):
+        admin_client = role_client(admin)
+        user_client = role_client(user)
+        assert user_client.get('/api/v1/users/me/').status_code == 200
+        response = admin_client.patch(f'/api/v1/users/{user.username}/', data={'role': 'moderator'})
+        assert response.status_code == 200
+        assert response.json()['role'] == 'moderator', (
+            'Проверьте, что PATCH `/api/v1/users/{username}/` изменяет указанного пользователя'
+        )
+        assert user_client.get('/api/v1/users/me/').status_code == 401, (
+            'Проверьте, что после смены роли выданные ранее токены отклоняются'
+        )
+        user.refresh_from_db()
+        assert role_client(user).get('/api/v1/users/me/').json()['role'] == 'moderator'
+        assert admin_client.get('/api/v1/users/me/').status_code == 200
+
+    @pytest.mark.django_db(transaction=True)
+    def test_04_rename_revokes_tokens(self, django_user_model, admin, user):
+        user_client = role_client(user)
+        old_username = user.username
+        response = role_client(admin).patch(
+            f'/api/v1/users/{old_username}/', data={'username': 'renamed'}
+        )
+        assert response.status_code == 200 and response.json()['username'] == 'renamed'
+        other = django_user_model.objects.create_user(
+            username=old_username, email='other@yamdb.fake'
+        )
+        assert user_client.get('/api/v1/users/me/').status_code == 401, (
+            'Проверьте, что после смены имени выданные ранее токены отклоняются'
+        )
+        user.refresh_from_db()
+        renamed_client = role_client(user)
+        response = renamed_client.get('/api/v1/users/me/')
+        assert response.json()['username'] == 'renamed', (
+            'Проверьте, что `/api/v1/users/me/` ищет пользователя по id из токена'
+        )
+        renamed_client.patch('/api/v1/users/me/', data={'bio': 'Новое о себе'})
+        other.refresh_from_db()
+        user.refresh_from_db()
+        assert not other.bio and user.bio == 'Новое о себе', (
+            'Проверьте, что PATCH `/api/v1/users/me/` изменяет владельца токена, '
+            'а не пользователя с именем из токена'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_revocation_seen_by_other_processes(self, user):
+        user_client = role_client(user)
+        assert user_client.get('/api/v1/users/me/').status_code == 200
+        # Другой процесс меняет версию токенов и сбрасывает свой кеш.
+        other_process = UserCache(
+            max_size=0,
+            shared_cache=token_version_cache.shared_cache,
+            key_prefix=token_version_cache.key_prefix,
+        )
+        User.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+        other_process.invalidate(user.pk)
+        assert user_client.get('/api/v1/users/me/').status_code == 401, (
+            'Проверьте, что отзыв токенов в одном процессе сразу действует во всех процессах'
+        )
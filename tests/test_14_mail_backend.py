@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+
+from users.mail import (
+    ShardedFileEmailBackend, last_confirmation_code, last_message, reversed_lines, shard_path,
+)
+
+
+class Test14MailBackend:
+
+    @staticmethod
+    def send(backend, address, code):
+        message = EmailMessage(
+            settings.MESSAGES['mail_theme'],
+            settings.MESSAGES['mail_text'].format(code),
+            settings.EMAIL_NOREPLAY_ADDRESS,
+            [address],
+        )
+        return backend.send_messages([message])
+
+    def test_01_sharded_mailboxes(self, tmp_path):
+        backend = ShardedFileEmailBackend(file_path=str(tmp_path), max_size=1024)
+        for i in range(10):
+            assert self.send(backend, f'user{i % 3}@yamdb.fake', f'code{i}') == 1
+        mailboxes = [path for path in tmp_path.rglob('mailbox-*.eml')]
+        assert len({path.parent for path in mailboxes}) == 3, (
+            'Проверьте, что письма раскладываются по каталогам адресов'
+        )
+        assert len(mailboxes) > 3, (
+            'Проверьте, что файл писем заменяется новым по достижении max_size'
+        )
+
+    def test_02_last_code(self, tmp_path):
+        backend = ShardedFileEmailBackend(file_path=str(tmp_path))
+        self.send(backend, 'user@yamdb.fake', 'first')
+        self.send(backend, 'other@yamdb.fake', 'other')
+        self.send(backend, 'User@yamdb.fake', 'second')
+        assert last_confirmation_code('user@yamdb.fake', str(tmp_path)) == 'second', (
+            'Проверьте, что находится код из последнего письма на адрес'
+        )
+        assert last_message('nobody@yamdb.fake', str(tmp_path)) is None
+
+    def test_03_multipart_and_index_tail(self, tmp_path):
+        backend = ShardedFileEmailBackend(file_path=str(tmp_path))
+        for i in range(50):
+            self.send(backend, 'user@yamdb.fake', f'code{i}')
+        message = EmailMultiAlternatives(
+            settings.MESSAGES['mail_theme'],
+            settings.MESSAGES['mail_text'].format('multipart'),
+            settings.EMAIL_NOREPLAY_ADDRESS,
+            ['user@yamdb.fake'],
+        )
+        message.attach_alternative('<p>html</p>', 'text/html')
+        backend.send_messages([message])
+        assert last_confirmation_code('user@yamdb.fake', str(tmp_path)) == 'multipart', (
+            'Проверьте, что код находится в текстовой части письма из нескольких частей'
+        )
+        index_path = next(tmp_path.rglob('index.tsv'))
+        lines = index_path.read_text().splitlines()
+        assert list(reversed_lines(str(index_path), block_size=16)) == lines[::-1], (
+            'Проверьте, что индекс читается с конца построчно'
+        )
+
+    def test_04_old_days_skipped(self, tmp_path):
+        shard = tmp_path / shard_path('', '2000-01-01', 'user@yamdb.fake')
+        shard.mkdir(parents=True)
+        (shard / 'index.tsv').write_text('user@yamdb.fake\t2000-01-01\tmailbox-0000.eml\t0\t0\n')
+        assert last_confirmation_code('user@yamdb.fake', str(tmp_path)) is None, (
+            'Проверьте, что письма старше срока действия кода не просматриваются'
+        )
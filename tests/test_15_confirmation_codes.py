@@ -0,0 +1,56 @@
+import re
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from users.models import ConfirmationCode, OutgoingEmail
+
+
+class Test15ConfirmationCodes:
+    url_signup = '/api/v1/auth/signup/'
+    url_token = '/api/v1/auth/token/'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_code_is_one_time(self, client):
+        data = {'email': 'valid@yamdb.fake', 'username': 'valid_username'}
+        client.post(self.url_signup, data=data)
+        code = re.search(r'code YaMDB (\S+)', OutgoingEmail.objects.get().body).group(1)
+        token_data = {'username': data['username'], 'confirmation_code': code}
+        response = client.post(self.url_token, data=token_data)
+        assert response.status_code == 200, (
+            f'Проверьте, что код из письма позволяет получить токен на `{self.url_token}`'
+        )
+        response = client.post(self.url_token, data=token_data)
+        assert response.status_code == 400, (
+            'Проверьте, что код подтверждения можно использовать только один раз'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_expired_code(self, client, user):
+        code = ConfirmationCode.objects.issue(user)
+        ConfirmationCode.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = client.post(self.url_token, data={'username': user.username, 'confirmation_code': code})
+        assert response.status_code == 400, (
+            'Проверьте, что просроченный код подтверждения не принимается'
+        )
+        ConfirmationCode.objects.issue(user)
+        call_command('purgecodes')
+        assert ConfirmationCode.objects.count() == 1, (
+            'Проверьте, что команда purgecodes удаляет только просроченные коды'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_code_not_kept_in_outbox(self, client):
+        client.post(self.url_signup, data={'email': 'valid@yamdb.fake', 'username': 'valid_username'})
+        call_command('sendoutbox')
+        assert OutgoingEmail.objects.get().body == '', (
+            'Проверьте, что после отправки текст письма с кодом удаляется из очереди'
+        )
+        client.post(self.url_signup, data={'email': 'valid@yamdb.fake', 'username': 'valid_username'})
+        OutgoingEmail.objects.update(created=timezone.now() - timedelta(days=1))
+        call_command('purgecodes')
+        assert not OutgoingEmail.objects.exists(), (
+            'Проверьте, что команда purgecodes удаляет письма старше срока действия кода'
+        )
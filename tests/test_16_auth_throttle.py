@@ -0,0 +1,79 @@
+import pytest
+
+from api.throttling import AuthIdentityThrottle
+from users.models import OutgoingEmail
+
+
+class Test16AuthThrottle:
+    url_signup = '/api/v1/auth/signup/'
+    url_token = '/api/v1/auth/token/'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_signup_identity_limit(self, client, user):
+        data = {'email': user.email, 'username': user.username}
+        statuses = [client.post(self.url_signup, data=data).status_code for _ in range(5)]
+        assert statuses == [200] * 5
+        response = client.post(self.url_signup, data=data)
+        assert response.status_code == 429, (
+            f'Проверьте, что частые запросы на `{self.url_signup}` для одного адреса ограничены'
+        )
+        assert int(response['Retry-After']) > 0, (
+            'Проверьте, что ответ 429 содержит заголовок Retry-After'
+        )
+        assert OutgoingEmail.objects.count() == 5, (
+            'Проверьте, что отклоненные запросы не ставят письма в очередь'
+        )
+        other = {'email': 'other@yamdb.fake', 'username': 'other'}
+        assert client.post(self.url_signup, data=other).status_code == 200, (
+            'Проверьте, что ограничение по адресу не затрагивает другие адреса'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_ip_limit(self, client):
+        for number in range(30):
+            client.post(self.url_token, data={'username': f'user{number}', 'confirmation_code': '1'})
+        response = client.post(self.url_token, data={'username': 'fresh', 'confirmation_code': '1'})
+        assert response.status_code == 429, (
+            f'Проверьте, что частые запросы на `{self.url_token}` с одного IP ограничены'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_concurrent_requests(self, monkeypatch):
+        class Throttle(AuthIdentityThrottle):
+            def get_ident_value(self, request, view):
+                return 'email:user@yamdb.fake'
+
+            def timer(self):
+                return 600.0
+
+        pending = [Throttle() for _ in range(6)]
+        allowed = []
+        in_incr = []
+        cache = Throttle.cache
+        incr = cache.incr
+
+        def atomic_incr(*args, **kwargs):
+            # incr выполняется под блокировкой и не прерывается другими запросами.
+            in_incr.append(True)
+            try:
+                return incr(*args, **kwargs)
+            finally:
+                in_incr.pop()
+
+        def concurrent(read):
+            # Сразу после чтения счетчиков выполняется другой запрос.
+            def wrapper(*args, **kwargs):
+                value = read(*args, **kwargs)
+                if pending and not in_incr:
+                    allowed.append(pending.pop().allow_request(None, None))
+                return value
+            return wrapper
+
+        monkeypatch.setattr(cache, 'incr', atomic_incr)
+        monkeypatch.setattr(cache, 'get', concurrent(cache.get))
+        monkeypatch.setattr(cache, 'get_many', concurrent(cache.get_many))
+        allowed.append(pending.pop().allow_request(None, None))
+        assert sorted(allowed) == [False] + [True] * 5, (
+            'Проверьте, что одновременные запросы не превышают ограничение, '
+            'даже если каждый из них прочитал счетчики до записи остальных'
+        )
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.serializers import BulkUserListSerializer
+from users.models import User
+
+
+class Test17UserBulk:
+    url = '/api/v1/users/bulk/'
+
+    @staticmethod
+    def rows(count, role='user'):
+        return [
+            {'username': f'bulk{role}{number}', 'email': f'bulk{role}{number}@yamdb.fake', 'role': role}
+            for number in range(count)
+        ]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_bulk_create(self, admin_client):
+        admin_client.get('/api/v1/users/')
+        rows = self.rows(20) + self.rows(20, role='admin')
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.post(self.url, data=json.dumps(rows), content_type='application/json')
+        assert response.status_code == 201, (
+            f'Проверьте, что POST запрос администратора на `{self.url}` создает пользователей'
+        )
+        assert len(response.json()) == 40
+        assert len(context) < 15, (
+            'Проверьте, что число запросов к БД не зависит от числа создаваемых пользователей'
+        )
+        admin = User.objects.get(username='bulkadmin7')
+        assert admin.is_staff and admin.has_perm('users.change_user'), (
+            'Проверьте, что созданные администраторы получают права'
+        )
+        assert not User.objects.get(username='bulkuser7').user_permissions.exists()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_bulk_errors(self, admin_client, user):
+        rows = self.rows(3)
+        rows[1]['username'] = user.username
+        rows[2]['email'] = rows[0]['email']
+        rows.append({'username': 'no_email'})
+        response = admin_client.post(self.url, data=json.dumps(rows), content_type='application/json')
+        assert response.status_code == 400
+        errors = response.json()
+        assert errors[0] == {} and 'username' in errors[1] and 'email' in errors[2] and 'email' in errors[3], (
+            'Проверьте, что ошибки массового создания возвращаются по строкам'
+        )
+        assert not User.objects.filter(username__startswith='bulk').exists(), (
+            'Проверьте, что при ошибках пользователи не создаются'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_bulk_forbidden(self, user_client, moderator_client):
+        for client in (user_client, moderator_client):
+            response = client.post(self.url, data=json.dumps(self.rows(1)), content_type='application/json')
+            assert response.status_code == 403, (
+                f'Проверьте, что `{self.url}` доступен только администратору'
+            )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_04_concurrent_signup(self, admin_client, monkeypatch):
+        rows = self.rows(3)
+        row_errors = BulkUserListSerializer.row_errors
+
+        def checked_then_taken(serializer, data):
+            errors = row_errors(serializer, data)
+            if not User.objects.filter(username=rows[1]['username']).exists():
+                # Пользователь регистрируется между проверкой и созданием.
+                User.objects.create(username=rows[1]['username'], email='signup@yamdb.fake')
+            return errors
+
+        monkeypatch.setattr(BulkUserListSerializer, 'row_errors', checked_then_taken)
+        response = admin_client.post(self.url, data=json.dumps(rows), content_type='application/json')
+        assert response.status_code == 400, (
+            'Проверьте, что занятое после проверки имя возвращает статус 400, а не ошибку сервера'
+        )
+        assert 'username' in response.json()[1], (
+            'Проверьте, что ошибка занятого имени возвращается в строке этого пользователя'
+        )
+        assert User.objects.filter(username__startswith='bulk').count() == 1, (
+            'Проверьте, что при ошибке создания пользователи списка не создаются'
+        )
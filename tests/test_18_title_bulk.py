@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import Category, Genre, Title
+
+
+class Test18TitleBulk:
+    url = '/api/v1/titles/bulk/'
+
+    @staticmethod
+    def create_catalog():
+        Category.objects.create(name='Фильм', slug='films')
+        Category.objects.create(name='Книга', slug='books')
+        Genre.objects.create(name='Драма', slug='drama')
+        Genre.objects.create(name='Комедия', slug='comedy')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_bulk_create(self, admin_client):
+        self.create_catalog()
+        admin_client.get('/api/v1/titles/')
+        rows = [
+            {
+                'name': f'Произведение {number}',
+                'year': 1950 + number,
+                'genre': ['drama', 'comedy'] if number % 2 else ['drama'],
+                'category': 'films' if number % 3 else 'books',
+            }
+            for number in range(60)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.post(self.url, data=json.dumps(rows), content_type='application/json')
+        assert response.status_code == 201, (
+            f'Проверьте, что POST запрос администратора на `{self.url}` создает произведения'
+        )
+        assert len(context) < 15, (
+            'Проверьте, что число запросов к БД не зависит от числа создаваемых произведений'
+        )
+        data = {title['name']: title for title in response.json()}
+        assert len(data) == 60
+        assert sorted(genre['slug'] for genre in data['Произведение 7']['genre']) == ['comedy', 'drama']
+        assert data['Произведение 3']['category']['slug'] == 'books'
+        title = Title.objects.get(name='Произведение 7')
+        assert title.year == 1957 and title.genre.count() == 2, (
+            'Проверьте, что произведения связаны со своими жанрами'
+        )
+        assert Title.objects.search('Произведение').count() == 60, (
+            'Проверьте, что созданные списком произведения находятся поиском'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_bulk_errors(self, admin_client, user_client):
+        self.create_catalog()
+        rows = [
+            {'name': 'Верно', 'year': 2000, 'genre': ['drama'], 'category': 'films'},
+            {'name': 'Жанр', 'year': 2000, 'genre': ['drama', 'horror'], 'category': 'films'},
+            {'name': 'Категория', 'year': 2000, 'genre': ['drama'], 'category': 'games'},
+            {'name': 'Год', 'year': 3000, 'genre': ['drama'], 'category': 'films'},
+        ]
+        response = user_client.post(self.url, data=json.dumps(rows), content_type='application/json')
+        assert response.status_code == 403
+        response = admin_client.post(self.url, data=json.dumps(rows), content_type='application/json')
+        assert response.status_code == 400
+        errors = response.json()
+        assert errors[0] == {} and 'genre' in errors[1] and 'category' in errors[2] and 'year' in errors[3], (
+            'Проверьте, что ошибки массового создания произведений возвращаются по строкам'
+        )
+        assert not Title.objects.exists(), (
+            'Проверьте, что при ошибках произведения не создаются'
+        )
@@ -0,0 +1,134 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+
+from reviews import versions
+from reviews.models import Category, Comment, Review, Title
+
+
+def later(monkeypatch, seconds=2):
+    now = versions.now
+    monkeypatch.setattr(versions, 'now', lambda: now() + seconds * 1000000)
+
+
+class Test19ConditionalGet:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_titles_not_modified(self, client, monkeypatch):
+        category = Category.objects.create(name='Фильм', slug='films')
+        Title.objects.create(name='Поворот туда', year=2000, category=category)
+        url = '/api/v1/titles/'
+        response = client.get(url)
+        etag = response['ETag']
+        later(monkeypatch)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304, (
+            f'Проверьте, что GET запрос на `{url}` с актуальным If-None-Match возвращает 304'
+        )
+        assert not any('reviews_title' in query['sql'] for query in context.captured_queries), (
+            'Проверьте, что ответ 304 возвращается без запроса произведений'
+        )
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        assert response.status_code == 304, (
+            f'Проверьте, что GET запрос на `{url}` с актуальным If-Modified-Since возвращает 304'
+        )
+        assert client.get(url, {'year': 2000}, HTTP_IF_NONE_MATCH=etag).status_code == 200, (
+            'Проверьте, что ETag зависит от параметров запроса'
+        )
+        category.name = 'Кино'
+        category.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200 and response['ETag'] != etag, (
+            'Проверьте, что изменение категории меняет ETag списка произведений'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_reviews_versioned_per_title(self, client, user):
+        first = Title.objects.create(name='Первое', year=2000)
+        second = Title.objects.create(name='Второе', year=2000)
+        first_url = f'/api/v1/titles/{first.id}/reviews/'
+        second_url = f'/api/v1/titles/{second.id}/reviews/'
+        first_etag = client.get(first_url)['ETag']
+        second_etag = client.get(second_url)['ETag']
+        titles_etag = client.get('/api/v1/titles/')['ETag']
+        Review.objects.create(title=first, author=user, text='Текст', score=7)
+        assert client.get(first_url, HTTP_IF_NONE_MATCH=first_etag).status_code == 200, (
+            'Проверьте, что новый отзыв меняет ETag отзывов произведения'
+        )
+        assert client.get(second_url, HTTP_IF_NONE_MATCH=second_etag).status_code == 304, (
+            'Проверьте, что отзыв не меняет ETag отзывов других произведений'
+        )
+        assert client.get('/api/v1/titles/', HTTP_IF_NONE_MATCH=titles_etag).status_code == 200, (
+            'Проверьте, что отзыв меняет ETag списка произведений с рейтингом'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_same_second_write(self, client, monkeypatch):
+        frozen = versions.now()
+        monkeypatch.setattr(versions, 'now', lambda: frozen)
+        Title.objects.create(name='Поворот туда', year=2000)
+        url = '/api/v1/titles/'
+        response = client.get(url)
+        assert 'Last-Modified' not in response, (
+            'Проверьте, что Last-Modified не отдается в секунду последнего изменения'
+        )
+        last_modified = versions.get_versions('title')[-1] // 1000000
+        Title.objects.create(name='Поворот обратно', year=2000)
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(last_modified))
+        assert response.status_code == 200, (
+            'Проверьте, что If-Modified-Since не возвращает 304 после записи в ту же секунду'
+        )
+        later(monkeypatch)
+        last_modified = client.get(url)['Last-Modified']
+        assert client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+
+    @pytest.mark.django_db(transaction=True)
+    def test_04_comment_version(self, client, user):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        review = Review.objects.create(title=title, author=user, text='Текст', score=7)
+        url = f'/api/v1/titles/{title.id}/reviews/'
+        etag = client.get(url)['ETag']
+        comment = Comment.objects.create(review=review, author=user, text='Комментарий')
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200, (
+            'Проверьте, что комментарий меняет ETag отзывов произведения'
+        )
+        etag = client.get(url)['ETag']
+        comment = Comment.objects.get(pk=comment.pk)
+        with CaptureQueriesContext(connection) as context:
+            comment.delete()
+        assert not any('SELECT "reviews_review"."id"' in query['sql'] for query in context.captured_queries), (
+            'Проверьте, что для версии отзывов не загружается отзыв комментария целиком'
+        )
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200, (
+            'Проверьте, что удаление комментария меняет ETag отзывов произведения'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_padded_title_id(self, client, user, admin):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        Review.objects.create(title=title, author=admin, text='Текст', score=5)
+        urls = [f'/api/v1/titles/0{title.id}/reviews/', f'/api/v1/titles/0{title.id}/stats/']
+        etags = [client.get(url)['ETag'] for url in urls]
+        Review.objects.create(title=title, author=user, text='Текст', score=7)
+        for url, etag in zip(urls, etags):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == 200, (
+                f'Проверьте, что новый отзыв меняет ETag `{url}` с id произведения, начинающимся с 0'
+            )
+        assert client.get(urls[1]).json()['count'] == 2
+
+    @pytest.mark.django_db(transaction=True)
+    def test_06_author_renamed(self, client, user):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        review = Review.objects.create(title=title, author=user, text='Текст', score=7)
+        url = f'/api/v1/titles/{title.id}/reviews/{review.id}/'
+        etag = client.get(url)['ETag']
+        user.refresh_from_db()
+        user.username = 'renamed'
+        user.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200 and response.json()['author'] == 'renamed', (
+            'Проверьте, что смена имени автора меняет ETag его отзывов'
+        )
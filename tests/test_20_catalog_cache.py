@@ -0,0 +1,52 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import Genre
+
+
+class Test20CatalogCache:
+
+    @staticmethod
+    def catalog_queries(client, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, params or {})
+        assert response.status_code == 200
+        queries = [query['sql'] for query in context.captured_queries if 'reviews_' in query['sql']]
+        return response.json(), queries
+
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize('url', ['/api/v1/categories/', '/api/v1/genres/'])
+    def test_01_list_cached(self, admin_client, client, url):
+        for name, slug in (('Драма', 'drama'), ('Комедия', 'comedy')):
+            admin_client.post(url, data={'name': name, 'slug': slug})
+        first, _ = self.catalog_queries(client, url, {'search': 'Дра'})
+        second, queries = self.catalog_queries(client, url, {'search': 'Дра'})
+        assert second == first and not queries, (
+            f'Проверьте, что повторный GET запрос на `{url}` отдается из кеша без запросов к БД'
+        )
+        other, _ = self.catalog_queries(client, url, {'search': 'Ком'})
+        assert [item['slug'] for item in other['results']] == ['comedy'], (
+            'Проверьте, что в кеше ответы различаются по параметрам поиска'
+        )
+        admin_client.post(url, data={'name': 'Драма сериала', 'slug': 'series-drama'})
+        data, _ = self.catalog_queries(client, url, {'search': 'Дра'})
+        assert data['count'] == 2, (
+            f'Проверьте, что создание объекта сбрасывает кеш `{url}`'
+        )
+        admin_client.delete(f'{url}drama/')
+        data, _ = self.catalog_queries(client, url, {'search': 'Дра'})
+        assert data['count'] == 1, (
+            f'Проверьте, что удаление объекта сбрасывает кеш `{url}`'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_direct_changes_reset_cache(self, client):
+        genre = Genre.objects.create(name='Драма', slug='drama')
+        self.catalog_queries(client, '/api/v1/genres/')
+        genre.name = 'Трагедия'
+        genre.save()
+        data, _ = self.catalog_queries(client, '/api/v1/genres/')
+        assert data['results'][0]['name'] == 'Трагедия', (
+            'Проверьте, что изменение жанра вне API сбрасывает кеш списка'
+        )
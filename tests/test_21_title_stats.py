@@ -0,0 +1,53 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import Review, Title
+
+
+class Test21TitleStats:
+
+    @staticmethod
+    def create_reviews(django_user_model, title, scores):
+        for number, score in enumerate(scores):
+            author = django_user_model.objects.create_user(
+                username=f'stats{title.id}_{number}', email=f'stats{title.id}_{number}@yamdb.fake'
+            )
+            Review.objects.create(title=title, author=author, text='Текст', score=score)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_stats(self, client, django_user_model):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        url = f'/api/v1/titles/{title.id}/stats/'
+        response = client.get(url)
+        assert response.status_code == 200, (
+            f'Проверьте, что GET запрос на `{url}` возвращает статистику оценок'
+        )
+        assert response.json() == {
+            'count': 0, 'mean': None, 'median': None,
+            'histogram': {str(score): 0 for score in range(1, 11)},
+        }
+        self.create_reviews(django_user_model, title, [2, 7, 7, 10])
+        data = client.get(url).json()
+        assert data['count'] == 4 and data['mean'] == 6.5 and data['median'] == 7, (
+            'Проверьте, что статистика содержит число отзывов, среднюю и медианную оценку'
+        )
+        assert data['histogram']['7'] == 2 and data['histogram']['1'] == 0, (
+            'Проверьте, что гистограмма содержит число отзывов с каждой оценкой'
+        )
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        assert not any('reviews_review' in query['sql'] for query in context.captured_queries), (
+            'Проверьте, что статистика кешируется до изменения отзывов'
+        )
+        Review.objects.filter(title=title, score=2).get().delete()
+        assert client.get(url).json()['median'] == 7 and client.get(url).json()['count'] == 3, (
+            'Проверьте, что удаление отзыва сбрасывает кеш статистики'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_stats_not_found(self, client):
+        assert client.get('/api/v1/titles/999/stats/').status_code == 404
+        assert client.get('/api/v1/titles/abc/stats/').status_code == 404, (
+            'Проверьте, что статистика произведения с нечисловым id возвращает статус 404'
+        )
@@ -0,0 +1,72 @@
+import pytest
+from django.core.management import call_command
+
+from reviews.models import Genre, Review, Title
+
+
+class Test22TopTitles:
+    url = '/api/v1/titles/top/'
+
+    @staticmethod
+    def create_reviews(authors, title, scores):
+        for author, score in zip(authors, scores):
+            Review.objects.create(title=title, author=author, text='Текст', score=score)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_top_weighted(self, client, django_user_model):
+        authors = [
+            django_user_model.objects.create_user(username=f'critic{i}', email=f'critic{i}@yamdb.fake')
+            for i in range(10)
+        ]
+        drama = Genre.objects.create(name='Драма', slug='drama')
+        single = Title.objects.create(name='Одна оценка', year=2000)
+        popular = Title.objects.create(name='Много оценок', year=2001)
+        average = Title.objects.create(name='Средние оценки', year=2001)
+        Title.objects.create(name='Без отзывов', year=2001)
+        single.genre.add(drama)
+        average.genre.add(drama)
+        self.create_reviews(authors, single, [10])
+        self.create_reviews(authors, popular, [9] * 10)
+        self.create_reviews(authors, average, [5] * 3)
+        assert Title.objects.filter(weighted_rating__isnull=False).count() == 3, (
+            'Проверьте, что отзывы обновляют взвешенный рейтинг произведения'
+        )
+        call_command('recountratings')
+
+        response = client.get(self.url)
+        assert response.status_code == 200, (
+            f'Проверьте, что GET запрос на `{self.url}` возвращает список лучших произведений'
+        )
+        names = [title['name'] for title in response.json()['results']]
+        assert names == ['Много оценок', 'Одна оценка', 'Средние оценки'], (
+            'Проверьте, что произведения упорядочены по взвешенному рейтингу, '
+            'а произведения без отзывов не попадают в список'
+        )
+        names = [title['name'] for title in client.get(self.url, {'genre': 'drama'}).json()['results']]
+        assert names == ['Одна оценка', 'Средние оценки'], (
+            f'Проверьте, что `{self.url}` фильтрует по жанру'
+        )
+        names = [title['name'] for title in client.get(self.url, {'year': 2001}).json()['results']]
+        assert names == ['Много оценок', 'Средние оценки'], (
+            f'Проверьте, что `{self.url}` фильтрует по году'
+        )
+
+        Review.objects.filter(title=popular).delete()
+        names = [title['name'] for title in client.get(self.url).json()['results']]
+        assert names == ['Одна оценка', 'Средние оценки'], (
+            'Проверьте, что изменение отзывов обновляет список лучших произведений'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_top_cursor(self, client, django_user_model):
+        author = django_user_model.objects.create_user(username='critic', email='critic@yamdb.fake')
+        for score in range(1, 8):
+            title = Title.objects.create(name=f'Произведение {score}', year=2000)
+            self.create_reviews([author], title, [score])
+        response = client.get(self.url, {'pagination': 'cursor'})
+        data = response.json()
+        names = [title['name'] for title in data['results']]
+        names += [title['name'] for title in client.get(data['next']).json()['results']]
+        assert names == [f'Произведение {score}' for score in range(7, 0, -1)], (
+            f'Проверьте, что `{self.url}?pagination=cursor` сохраняет порядок по взвешенному рейтингу'
+        )
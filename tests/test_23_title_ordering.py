@@ -0,0 +1,109 @@
+import json
+from base64 import b64encode
+from urllib.parse import urlencode
+
+import pytest
+
+from reviews.models import Title
+
+
+class Test23TitleOrdering:
+    url = '/api/v1/titles/'
+
+    @staticmethod
+    def create_titles():
+        ratings = [7, None, 7, 3, 7, None, 10, 3, 7, 1, None, 7]
+        for number, rating in enumerate(ratings):
+            title = Title.objects.create(name=f'Произведение {number:02}', year=2000 + number % 3)
+            Title.objects.filter(pk=title.pk).update(rating=rating, review_count=number % 4)
+
+    def walk(self, client, params):
+        response = client.get(self.url, {**params, 'pagination': 'cursor'})
+        pages = []
+        while True:
+            assert response.status_code == 200
+            data = response.json()
+            pages.append([title['id'] for title in data['results']])
+            if not data['next']:
+                return pages, data
+            response = client.get(data['next'])
+
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize('ordering', [
+        'name', '-year', 'rating', '-rating', '-review_count', 'rating,year', '-rating,-year',
+        'year,-rating', None,
+    ])
+    def test_01_keyset_pages(self, client, ordering):
+        self.create_titles()
+        keys = ordering.split(',') if ordering else ['name', 'year']
+        expected = list(
+            Title.objects.order_by(*keys, '-id' if keys[0].startswith('-') else 'id')
+            .values_list('id', flat=True)
+        )
+        params = {'ordering': ordering} if ordering else {}
+        pages, last = self.walk(client, params)
+        page_mode = [
+            title['id']
+            for page in range(1, 4)
+            for title in client.get(self.url, {**params, 'page': page}).json()['results']
+        ]
+        assert [pk for page in pages for pk in page] == expected == page_mode, (
+            f'Проверьте, что пагинация по курсору с `?ordering={ordering}` '
+            f'проходит все произведения в порядке `{",".join(keys)}`, как и постраничный вывод, '
+            'без пропусков и повторов'
+        )
+        previous = client.get(last['previous']).json()
+        assert [title['id'] for title in previous['results']] == pages[-2], (
+            'Проверьте, что ссылка на предыдущую страницу возвращает предыдущую страницу'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_page_number_ordering(self, client):
+        self.create_titles()
+        data = client.get(self.url, {'ordering': '-rating'}).json()
+        ratings = [title['rating'] for title in data['results']]
+        assert data['count'] == 12 and ratings[0] == 10 and ratings[1:] == [7, 7, 7, 7], (
+            f'Проверьте, что `{self.url}?ordering=-rating` сортирует по рейтингу'
+        )
+        data = client.get(self.url, {'ordering': 'description'}).json()
+        assert data['results'][0]['name'] == 'Произведение 00', (
+            'Проверьте, что сортировка по неразрешенному полю не применяется'
+        )
+
+    @staticmethod
+    def cursor(position):
+        return b64encode(urlencode({'p': position}).encode('ascii')).decode('ascii')
+
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize('ordering,position', [
+        ('year', '["год", 1]'),
+        ('year', '[2000, "id"]'),
+        ('-rating', '[[7], 1]'),
+        ('name', '[{"a": 1}, {"b": 2}]'),
+        ('name', '5'),
+        ('name', '["Произведение 01", [1]]'),
+        ('name', '["Произведение 01", null]'),
+        ('rating,year', '[7, 1]'),
+        ('rating,year', '[7, "год", 1]'),
+    ])
+    def test_03_tampered_cursor(self, client, ordering, position):
+        self.create_titles()
+        params = {'ordering': ordering, 'pagination': 'cursor', 'cursor': self.cursor(position)}
+        response = client.get(self.url, params)
+        assert response.status_code == 404, (
+            'Проверьте, что измененный курсор с неверными значениями возвращает статус 404'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_04_search_cursor(self, client):
+        for number in range(7):
+            Title.objects.create(
+                name=f'Фильм {number}', year=2000,
+                description='фильм ' * (number % 3) + 'описание',
+            )
+        expected = list(Title.objects.search('фильм').values_list('id', flat=True))
+        assert expected != sorted(expected)
+        pages, _ = self.walk(client, {'search': 'фильм'})
+        assert len(pages) == 2 and [pk for page in pages for pk in page] == expected, (
+            'Проверьте, что пагинация по курсору с `?search=` сохраняет порядок по релевантности'
+        )
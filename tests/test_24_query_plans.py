@@ -0,0 +1,64 @@
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+
+from api.management.commands import explainqueries
+from reviews.models import Comment, Genre, Review, Title
+
+
+class Test24QueryPlans:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_endpoints_use_indexes(self, user):
+        genres = [Genre.objects.create(name=f'Жанр {i}', slug=f'genre{i}') for i in range(3)]
+        for number in range(30):
+            title = Title.objects.create(name=f'Произведение {number:02}', year=2000 + number % 5)
+            title.genre.add(genres[number % 3])
+        review = Review.objects.create(title=title, author=user, text='Текст', score=7)
+        Comment.objects.create(review=review, author=user, text='Текст')
+        out = StringIO()
+        call_command('explainqueries', stdout=out)
+        lines = out.getvalue().splitlines()
+        names = [line.split(':')[0].split(maxsplit=1)[1] for line in lines]
+        assert names == [
+            'titles', 'titles cursor', 'titles ordering', 'titles genre', 'titles top',
+            'reviews', 'reviews cursor', 'comments', 'users',
+        ], 'Проверьте, что команда explainqueries проверяет основные эндпоинты API'
+        assert not any(line.startswith('FAIL') for line in lines), (
+            'Проверьте, что основные запросы эндпоинтов не просматривают таблицы целиком:\n'
+            + out.getvalue()
+        )
+
+    def test_03_plan_status(self):
+        table = 'reviews_title'
+        assert explainqueries.plan_status(
+            ['SCAN reviews_title USING INDEX title_name_year_idx'], table
+        ) == 'ok'
+        assert explainqueries.plan_status(['SCAN reviews_title'], table) == 'FAIL'
+        assert explainqueries.plan_status(
+            ['SCAN reviews_title USING INDEX title_year_idx', 'USE TEMP B-TREE FOR ORDER BY'], table
+        ) == 'FAIL', 'Проверьте, что чтение всей таблицы с сортировкой считается полным просмотром'
+        assert explainqueries.plan_status(
+            ['SEARCH reviews_title USING INTEGER PRIMARY KEY (rowid=?)', 'USE TEMP B-TREE FOR ORDER BY'], table
+        ) == 'sort', 'Проверьте, что сортировка найденных по индексу строк отмечается как sort'
+        assert explainqueries.plan_status(
+            ['SCAN reviews_title USING INDEX title_name_year_idx', 'USE TEMP B-TREE FOR RIGHT PART OF ORDER BY'],
+            table,
+        ) == 'ok'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_full_scan_reported(self, user, admin):
+        # Второй пользователь меняет LIMIT в тексте запроса: sqlite3 не
+        # перестраивает закешированный EXPLAIN после удаления индекса.
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX user_role_username_idx')
+        try:
+            with pytest.raises(CommandError, match='users'):
+                call_command('explainqueries', stdout=StringIO())
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'CREATE INDEX user_role_username_idx ON users_user (role, username)'
+                )
@@ -0,0 +1,83 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import pagination
+from reviews.models import Category, Genre, Title
+
+
+class Test25PaginationCount:
+
+    @staticmethod
+    def create_titles(size):
+        category = Category.objects.create(name='Фильм', slug='movie')
+        genre = Genre.objects.create(name='Драма', slug='drama')
+        for i in range(size):
+            title = Title.objects.create(name=f'Фильм {i}', year=2000, category=category)
+            title.genre.add(genre)
+
+    @staticmethod
+    def count_queries(client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == 200
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT COUNT(') and 'reviews_title' in query['sql']
+        ]
+        return response.json(), queries
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_count_query_stripped(self, client):
+        self.create_titles(7)
+        data, queries = self.count_queries(client, '/api/v1/titles/?genre=drama&search=Фильм')
+        assert data['count'] == 7, (
+            'Проверьте, что GET запрос `/api/v1/titles/` возвращает число произведений'
+        )
+        assert len(queries) == 1, (
+            'Проверьте, что число произведений считается одним запросом'
+        )
+        assert 'ORDER BY' not in queries[0] and 'reviews_category' not in queries[0], (
+            'Проверьте, что запрос подсчета выполняется без сортировки и join категорий'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_count_cached(self, client, admin_client):
+        self.create_titles(7)
+        self.count_queries(client, '/api/v1/titles/')
+        data, queries = self.count_queries(client, '/api/v1/titles/?page=2')
+        assert data['count'] == 7 and not queries, (
+            'Проверьте, что число произведений берется из кеша для других страниц'
+        )
+        data, queries = self.count_queries(client, '/api/v1/titles/?year=1999')
+        assert data['count'] == 0 and queries, (
+            'Проверьте, что число произведений кешируется отдельно для каждого фильтра'
+        )
+        admin_client.delete(f'/api/v1/titles/{Title.objects.first().id}/')
+        data, _ = self.count_queries(client, '/api/v1/titles/')
+        assert data['count'] == 6, (
+            'Проверьте, что удаление произведения сбрасывает кеш числа произведений'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_uncounted(self, client, monkeypatch):
+        self.create_titles(7)
+        data, queries = self.count_queries(client, '/api/v1/titles/?count=false')
+        assert data['count'] is None and not queries, (
+            'Проверьте, что с `?count=false` число произведений не считается'
+        )
+        assert len(data['results']) == 5 and data['next'], (
+            'Проверьте, что с `?count=false` есть ссылка на следующую страницу'
+        )
+        data, _ = self.count_queries(client, data['next'])
+        assert len(data['results']) == 2 and data['next'] is None, (
+            'Проверьте, что на последней странице нет ссылки на следующую'
+        )
+        assert client.get('/api/v1/titles/?count=false&page=3').status_code == 404, (
+            'Проверьте, что запрос страницы после последней возвращает статус 404'
+        )
+        monkeypatch.setitem(pagination.PAGINATION_COUNT, 'LIMIT', 6)
+        data, _ = self.count_queries(client, '/api/v1/titles/?year=2000')
+        assert data['count'] is None and data['next'], (
+            'Проверьте, что число записей больше предела не возвращается'
+        )
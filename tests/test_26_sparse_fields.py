@@ -0,0 +1,88 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import Category, Genre, Review, Title
+
+
+class Test26SparseFields:
+
+    @staticmethod
+    def create_title(user):
+        category = Category.objects.create(name='Фильм', slug='movie')
+        genre = Genre.objects.create(name='Драма', slug='drama')
+        title = Title.objects.create(
+            name='Поворот туда', year=2000, category=category, description='Длинное описание'
+        )
+        title.genre.add(genre)
+        Review.objects.create(title=title, author=user, text='Длинный текст', score=7)
+        return title
+
+    @staticmethod
+    def get(client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and 'COUNT(' not in query['sql']
+            and 'FROM "yamdb_' not in query['sql']
+        ]
+        return response, queries
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_title_fields(self, client, user):
+        self.create_title(user)
+        response, queries = self.get(client, '/api/v1/titles/?fields=name,rating')
+        assert response.status_code == 200
+        assert set(response.json()['results'][0]) == {'name', 'rating'}, (
+            'Проверьте, что с `?fields=` GET запрос `/api/v1/titles/` возвращает только '
+            'перечисленные поля'
+        )
+        assert len(queries) == 1, (
+            'Проверьте, что с `?fields=` без genre и category связанные объекты не запрашиваются'
+        )
+        assert 'description' not in queries[0] and 'reviews_category' not in queries[0], (
+            'Проверьте, что с `?fields=` из БД читаются только нужные колонки'
+        )
+        response, queries = self.get(client, '/api/v1/titles/?omit=description,genre')
+        fields = set(response.json()['results'][0])
+        assert fields == {'id', 'name', 'year', 'rating', 'category'}, (
+            'Проверьте, что с `?omit=` GET запрос `/api/v1/titles/` возвращает остальные поля'
+        )
+        assert len(queries) == 1 and 'reviews_category' in queries[0], (
+            'Проверьте, что с `?omit=genre` жанры не запрашиваются, а категория читается join'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_review_and_user_fields(self, client, admin_client, user, django_user_model):
+        title = self.create_title(user)
+        for number in range(2):
+            author = django_user_model.objects.create_user(
+                username=f'critic{number}', email=f'critic{number}@yamdb.fake'
+            )
+            Review.objects.create(title=title, author=author, text='Текст', score=number + 1)
+        url = f'/api/v1/titles/{title.id}/reviews/'
+        _, full_queries = self.get(client, url)
+        response, queries = self.get(client, f'{url}?fields=score')
+        assert sorted(review['score'] for review in response.json()['results']) == [1, 2, 7], (
+            'Проверьте, что с `?fields=` отзывы содержат только перечисленные поля'
+        )
+        assert len(queries) <= len(full_queries), (
+            'Проверьте, что с `?fields=` отложенные поля не читаются отдельным запросом '
+            'для каждого отзыва'
+        )
+        assert all('users_user' not in sql and '"text"' not in sql for sql in queries), (
+            'Проверьте, что с `?fields=score` не читаются текст отзыва и автор'
+        )
+        response = admin_client.get(f'/api/v1/users/{user.username}/?omit=bio,email')
+        assert set(response.json()) == {'username', 'first_name', 'last_name', 'role'}, (
+            'Проверьте, что `?omit=` работает для GET запроса `/api/v1/users/{username}/`'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_unknown_field(self, client, user):
+        self.create_title(user)
+        response = client.get('/api/v1/titles/?fields=name,password')
+        assert response.status_code == 400 and 'fields' in response.json(), (
+            'Проверьте, что неизвестное поле в `?fields=` возвращает статус 400'
+        )
@@ -0,0 +1,103 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews import versions
+from reviews.models import Comment, Review, Title
+
+
+class Test27TitleScores:
+
+    @staticmethod
+    def counters(title):
+        title = Title.objects.get(pk=title.pk)
+        return title.score_sum, title.review_count, title.rating
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_counters_follow_reviews(self, user_client, admin_client, user, admin):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        url = f'/api/v1/titles/{title.id}/reviews/'
+        response = user_client.post(url, data={'text': 'Текст', 'score': 4})
+        admin_client.post(url, data={'text': 'Текст', 'score': 8})
+        assert self.counters(title) == (12, 2, 6), (
+            'Проверьте, что создание отзыва обновляет сумму оценок, число отзывов и рейтинг'
+        )
+        review_id = response.json()['id']
+        user_client.patch(f'{url}{review_id}/', data={'score': 10})
+        assert self.counters(title) == (18, 2, 9), (
+            'Проверьте, что изменение оценки отзыва обновляет рейтинг произведения'
+        )
+        user_client.patch(f'{url}{review_id}/', data={'text': 'Новый текст'})
+        assert self.counters(title) == (18, 2, 9), (
+            'Проверьте, что изменение текста отзыва не меняет рейтинг произведения'
+        )
+        user_client.delete(f'{url}{review_id}/')
+        assert self.counters(title) == (8, 1, 8), (
+            'Проверьте, что удаление отзыва обновляет рейтинг произведения'
+        )
+        admin.delete()
+        assert self.counters(title) == (0, 0, None), (
+            'Проверьте, что удаление автора с отзывами обновляет рейтинг произведения'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_title_delete(self, admin_client, user):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        Review.objects.create(title=title, author=user, text='Текст', score=7)
+        response = admin_client.delete(f'/api/v1/titles/{title.id}/')
+        assert response.status_code == 204 and not Review.objects.exists(), (
+            'Проверьте, что удаление произведения удаляет его отзывы'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_stale_instance(self, user):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        review = Review.objects.create(title=title, author=user, text='Текст', score=5)
+        first = Review.objects.get(pk=review.pk)
+        second = Review.objects.get(pk=review.pk)
+        first.score = 8
+        first.save()
+        second.score = 9
+        second.save()
+        assert self.counters(title) == (9, 1, 9), (
+            'Проверьте, что изменение оценки считается от сохраненной оценки, '
+            'а не от оценки, прочитанной при загрузке отзыва'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_04_delete_queries(self, admin_client, django_user_model):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        other = Title.objects.create(name='Поворот обратно', year=2000)
+        django_user_model.objects.bulk_create(
+            django_user_model(username=f'critic{i}', email=f'critic{i}@yamdb.fake') for i in range(50)
+        )
+        authors = list(django_user_model.objects.filter(username__startswith='critic'))
+        for author in authors:
+            review = Review.objects.create(title=title, author=author, text='Текст', score=5)
+            Comment.objects.bulk_create(
+                Comment(review=review, author=author, text='Текст') for _ in range(2)
+            )
+        Review.objects.create(title=other, author=authors[0], text='Текст', score=5)
+        stamp = versions.get_versions(versions.reviews(title.id))[-1]
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.delete(f'/api/v1/titles/{title.id}/')
+        assert response.status_code == 204 and not Comment.objects.exists()
+        assert len(context) < 30, (
+            'Проверьте, что удаление произведения не выполняет запросы для каждого отзыва '
+            f'и комментария: {len(context)} запросов'
+        )
+        assert versions.get_versions(versions.reviews(title.id))[-1] > stamp
+        assert self.counters(other) == (5, 1, 5)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_review_delete_queries(self, user_client, user):
+        title = Title.objects.create(name='Поворот туда', year=2000)
+        review = Review.objects.create(title=title, author=user, text='Текст', score=5)
+        Comment.objects.bulk_create(Comment(review=review, author=user, text='Текст') for _ in range(30))
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.delete(f'/api/v1/titles/{title.id}/reviews/{review.id}/')
+        assert response.status_code == 204 and self.counters(title) == (0, 0, None)
+        assert len(context) < 30, (
+            'Проверьте, что удаление отзыва не выполняет запросы для каждого комментария: '
+            f'{len(context)} запросов'
+        )
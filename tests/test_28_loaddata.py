@@ -0,0 +1,190 @@
+import csv
+import re
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+
+from reviews.management.commands import loaddata
+from reviews.models import Comment, Review, Title
+from users.models import User
+
+DATA = {
+    'users.csv': [
+        ('id', 'username', 'email', 'role', 'bio', 'first_name', 'last_name'),
+        (100, 'reader', 'reader@yamdb.fake', 'user', '', '', ''),
+        (101, 'critic', 'critic@yamdb.fake', 'user', '', '', ''),
+    ],
+    'genre.csv': [
+        ('id', 'name', 'slug'),
+        (1, 'Драма', 'drama'),
+        (2, 'Комедия', 'comedy'),
+    ],
+    'category.csv': [
+        ('id', 'name', 'slug'),
+        (1, 'Фильм', 'movie'),
+    ],
+    'titles.csv': [
+        ('id', 'name', 'year', 'category'),
+        (1, 'Поворот туда', 2000, 1),
+        (2, 'Поворот обратно', 2001, 1),
+        (3, 'Без категории', 2002, 99),
+    ],
+    'genre_title.csv': [
+        ('id', 'title_id', 'genre_id'),
+        (1, 1, 1),
+        (2, 1, 2),
+        (3, 2, 1),
+    ],
+    'review.csv': [
+        ('id', 'title_id', 'text', 'author', 'score', 'pub_date'),
+        (1, 1, 'Текст', 100, 6, '2020-01-01T00:00:00Z'),
+        (2, 1, 'Текст', 101, 8, '2020-01-02T00:00:00Z'),
+        (3, 2, 'Текст', 100, 5, '2020-01-03T00:00:00Z'),
+        (4, 99, 'Текст', 100, 5, '2020-01-04T00:00:00Z'),
+    ],
+    'comments.csv': [
+        ('id', 'review_id', 'text', 'author', 'pub_date'),
+        (1, 1, 'Согласен', 101, '2020-01-05T00:00:00Z'),
+    ],
+}
+
+
+def write_data(directory, data=DATA):
+    for filename, rows in data.items():
+        with open(directory / filename, 'w', newline='', encoding='utf-8') as csvfile:
+            csv.writer(csvfile).writerows(rows)
+
+
+def load(directory, *args):
+    out = StringIO()
+    call_command('loaddata', '--data-dir', str(directory), '--workers', '0', *args, stdout=out)
+    return out.getvalue()
+
+
+class Test28LoadData:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_00_load(self, tmp_path):
+        write_data(tmp_path)
+        output = load(tmp_path)
+        assert (
+            User.objects.count(), Title.objects.count(), Title.genre.through.objects.count(),
+            Review.objects.count(), Comment.objects.count(),
+        ) == (2, 2, 3, 3, 1), (
+            'Проверьте, что команда loaddata загружает все строки CSV файлов'
+        )
+        assert 'titles.csv: 3 rows, 1 skipped' in output and 'review.csv: 4 rows, 1 skipped' in output, (
+            'Проверьте, что строки со ссылками на несуществующие записи пропускаются'
+        )
+        assert Title.objects.get(pk=1).rating == 7, (
+            'Проверьте, что после загрузки отзывов пересчитывается рейтинг произведений'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_resume(self, tmp_path, monkeypatch):
+        write_data(tmp_path)
+        checkpoint = tmp_path / 'load.json'
+        drop_orphans = loaddata.drop_orphans
+
+        def interrupted(rows, foreign_keys):
+            if rows and isinstance(rows[0].obj, Review) and rows[0].obj.pk > 2:
+                raise KeyboardInterrupt
+            return drop_orphans(rows, foreign_keys)
+
+        monkeypatch.setattr(loaddata, 'drop_orphans', interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            load(tmp_path, '--batch-size', '2', '--checkpoint', str(checkpoint))
+        assert Review.objects.count() == 2 and checkpoint.exists(), (
+            'Проверьте, что с `--checkpoint` записанные пачки сохраняются при прерывании загрузки'
+        )
+        monkeypatch.setattr(loaddata, 'drop_orphans', drop_orphans)
+        output = load(tmp_path, '--batch-size', '2', '--checkpoint', str(checkpoint))
+        assert 'review.csv: 2 rows, 1 skipped' in output and 'users.csv: 0 rows' in output, (
+            'Проверьте, что повторный запуск продолжает загрузку с сохраненной позиции'
+        )
+        assert Review.objects.count() == 3 and not checkpoint.exists(), (
+            'Проверьте, что после завершения загрузки файл позиций удаляется'
+        )
+
+    def test_02_unknown_file(self, tmp_path):
+        with pytest.raises(CommandError, match='Неизвестные файлы данных: notes.csv'):
+            call_command('loaddata', str(tmp_path / 'notes.csv'))
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_parallel(self, tmp_path):
+        write_data(tmp_path)
+        out = StringIO()
+        call_command('loaddata', '--data-dir', str(tmp_path), '--workers', '2', stdout=out)
+        assert (Title.objects.count(), Review.objects.count(), Comment.objects.count()) == (2, 3, 1), (
+            'Проверьте, что команда loaddata загружает данные при разборе файлов в нескольких процессах'
+        )
+        stages = re.findall(r'stage \d+ \(([^)]*)\)', out.getvalue())
+        assert stages == [
+            'users.csv, genre.csv, category.csv', 'titles.csv', 'genre_title.csv, review.csv',
+            'comments.csv',
+        ], 'Проверьте, что файлы записываются этапами в порядке зависимостей'
+
+    def test_04_circular_dependency(self):
+        first = loaddata.Table('first.csv', Review, None, {'title_id': Title}, ())
+        second = loaddata.Table('second.csv', Title, None, {'review_id': Review}, ())
+        with pytest.raises(CommandError, match='Циклическая зависимость'):
+            loaddata.dependency_stages([(first, 'first.csv'), (second, 'second.csv')])
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_upsert(self, tmp_path):
+        write_data(tmp_path)
+        load(tmp_path, '--upsert')
+        output = load(tmp_path, '--upsert')
+        assert re.findall(r'(\d+) changed', output) == ['0'] * 7, (
+            'Проверьте, что повторная загрузка с `--upsert` без изменений ничего не меняет'
+        )
+        data = dict(DATA)
+        data['titles.csv'] = [
+            row if row[0] != 2 else (2, 'Новое название', 2001, 1) for row in DATA['titles.csv']
+        ]
+        data['genre_title.csv'] = [
+            row if row[0] != 2 else (2, 2, 2) for row in DATA['genre_title.csv']
+        ]
+        write_data(tmp_path, data)
+        output = load(tmp_path, '--upsert')
+        assert 'titles.csv: 3 rows, 1 skipped, 1 changed' in output, (
+            'Проверьте, что с `--upsert` обновляются только измененные строки'
+        )
+        assert Title.objects.get(pk=2).name == 'Новое название', (
+            'Проверьте, что с `--upsert` измененная запись обновляется'
+        )
+        genres = {title.pk: {genre.slug for genre in title.genre.all()} for title in Title.objects.all()}
+        assert genres == {1: {'drama'}, 2: {'drama', 'comedy'}}, (
+            'Проверьте, что с `--upsert` связи произведения с жанрами, которых больше нет '
+            'в genre_title.csv, удаляются'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_06_upsert_role_revokes_tokens(self, tmp_path):
+        write_data(tmp_path)
+        load(tmp_path, '--upsert')
+        versions = dict(User.objects.values_list('username', 'token_version'))
+        data = dict(DATA)
+        data['users.csv'] = [
+            row if row[0] != 101 else (101, 'critic', 'critic@yamdb.fake', 'admin', '', '', '')
+            for row in DATA['users.csv']
+        ]
+        write_data(tmp_path, data)
+        load(tmp_path, '--upsert')
+        assert dict(User.objects.values_list('username', 'token_version')) == {
+            'reader': versions['reader'], 'critic': versions['critic'] + 1,
+        }, (
+            'Проверьте, что смена роли при загрузке с `--upsert` увеличивает версию токенов '
+            'только этого пользователя'
+        )
+        assert Review.objects.count() == 3
+
+    @pytest.mark.parametrize('max_query_params,sizes', [(None, [999, 1]), (3, [2] * 500)])
+    def test_07_in_chunks(self, monkeypatch, max_query_params, sizes):
+        monkeypatch.setattr(connection.features, 'max_query_params', max_query_params)
+        assert [len(chunk) for chunk in loaddata.in_chunks(range(1000))] == sizes
+        assert list(loaddata.in_chunks([7])) == [[7]], (
+            'Проверьте, что значения разбиваются на части и без ограничения СУБД на число параметров'
+        )
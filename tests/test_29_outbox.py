@@ -0,0 +1,100 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from users.management.commands import sendoutbox
+from users.models import OutgoingEmail
+
+
+def queue(count=1):
+    for i in range(count):
+        OutgoingEmail.objects.create(
+            recipient=f'user{i}@yamdb.fake', subject='Тема', body='Текст', from_email='noreplay@yamdb.fake'
+        )
+
+
+def send_outbox(*args):
+    out = StringIO()
+    call_command('sendoutbox', *args, stdout=out)
+    return out.getvalue()
+
+
+def fail_send(self):
+    raise OSError('Сервер недоступен')
+
+
+class Test29Outbox:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_send_outside_transaction(self, monkeypatch):
+        queue(2)
+        in_transaction = []
+        send = sendoutbox.EmailMessage.send
+
+        def checked_send(self):
+            in_transaction.append(connection.in_atomic_block)
+            return send(self)
+
+        monkeypatch.setattr(sendoutbox.EmailMessage, 'send', checked_send)
+        output = send_outbox()
+        assert len(mail.outbox) == 2 and 'sent: 2, failed: 0' in output
+        assert in_transaction == [False, False], (
+            'Проверьте, что письма отправляются вне транзакции и без блокировки строк очереди'
+        )
+        assert not OutgoingEmail.objects.filter(sent_at__isnull=True).exists()
+        assert set(OutgoingEmail.objects.values_list('attempts', flat=True)) == {1}
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_retry_backoff(self, monkeypatch):
+        queue()
+        monkeypatch.setattr(sendoutbox.EmailMessage, 'send', fail_send)
+        before = timezone.now()
+        assert 'sent: 0, failed: 1' in send_outbox('--retry-delay', '60')
+        email = OutgoingEmail.objects.get()
+        assert email.attempts == 1 and email.sent_at is None and email.last_error, (
+            'Проверьте, что неудачная отправка засчитывает попытку и сохраняет ошибку'
+        )
+        assert before + timedelta(seconds=60) <= email.send_after <= timezone.now() + timedelta(seconds=60), (
+            'Проверьте, что первая повторная попытка назначается через --retry-delay секунд'
+        )
+        assert 'sent: 0' not in send_outbox('--retry-delay', '60'), (
+            'Проверьте, что письмо не отправляется повторно до наступления send_after'
+        )
+        OutgoingEmail.objects.update(send_after=timezone.now())
+        before = timezone.now()
+        send_outbox('--retry-delay', '60')
+        email.refresh_from_db()
+        assert email.attempts == 2 and email.send_after >= before + timedelta(seconds=120), (
+            'Проверьте, что задержка перед повторной попыткой удваивается'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_give_up_and_stats(self, monkeypatch):
+        queue(3)
+        monkeypatch.setattr(sendoutbox.EmailMessage, 'send', fail_send)
+        for _ in range(2):
+            send_outbox('--max-attempts', '2')
+            OutgoingEmail.objects.update(send_after=timezone.now())
+        assert 'sent: 0' not in send_outbox('--max-attempts', '2'), (
+            'Проверьте, что после --max-attempts попыток письмо больше не отправляется'
+        )
+        assert set(OutgoingEmail.objects.values_list('attempts', flat=True)) == {2}
+        queue()
+        assert send_outbox('--stats', '--max-attempts', '2').strip() == 'queued: 1, failed: 3', (
+            'Проверьте, что `--stats` выводит число писем в очереди и неотправленных писем'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_04_lease(self, monkeypatch):
+        queue()
+        monkeypatch.setattr(sendoutbox.Command, 'send', lambda self, email, connection: None)
+        send_outbox('--lease', '300')
+        email = OutgoingEmail.objects.get()
+        assert email.attempts == 1 and email.send_after > timezone.now() + timedelta(seconds=290), (
+            'Проверьте, что письма пачки занимаются на время --lease до записи результата'
+        )